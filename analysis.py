@@ -0,0 +1,118 @@
+# pylint: disable=import-error
+"""the analysis of a chess game's mainline, built with one replay of its moves,
+to be used by all later stages: ECO lookup, diagrams and document"""
+
+import array
+import io
+import sys
+
+import chess
+import chess.pgn
+import chess.polyglot
+
+
+def board_snapshot(board: chess.BaseBoard) -> tuple:
+    """Return the pieces of the board as tuple of its bitboards:
+    (pawns, knights, bishops, rooks, queens, kings, white, black)"""
+    return (board.pawns, board.knights, board.bishops,
+            board.rooks, board.queens, board.kings,
+            board.occupied_co[chess.WHITE], board.occupied_co[chess.BLACK])
+
+
+def snapshot2board(snapshot: tuple) -> chess.BaseBoard:
+    """Return the chess.BaseBoard with the pieces of the snapshot"""
+    board = chess.BaseBoard.empty()
+    (board.pawns, board.knights, board.bishops,
+     board.rooks, board.queens, board.kings,
+     board.occupied_co[chess.WHITE], board.occupied_co[chess.BLACK]) = snapshot
+    board.occupied = board.occupied_co[chess.WHITE] | board.occupied_co[chess.BLACK]
+    return board
+
+
+class GameAnalysis:
+    """The mainline of one game, replayed once: per half move its SAN,
+    its from and to square, the square of the king in check after it, if any,
+    and a snapshot of the position after it;
+    squares and snapshots are kept as compact arrays"""
+    __slots__ = ('first_fen', 'first_turn', 'first_fullmove',
+                 'sans', 'from_squares', 'to_squares', 'check_squares',
+                 'snapshots')
+
+    def __init__(self, board=None):
+        if board is None:
+            board = chess.Board()
+        self.first_fen = board.fen()
+        self.first_turn = board.turn
+        self.first_fullmove = board.fullmove_number
+        self.sans = []
+        self.from_squares = array.array('B')
+        self.to_squares = array.array('B')
+        self.check_squares = []
+        # the 8 bitboards of board_snapshot() per half move, one after the other
+        self.snapshots = array.array('Q')
+
+    def __len__(self) -> int:
+        return len(self.sans)
+
+    def __eq__(self, other) -> bool:
+        if not isinstance(other, GameAnalysis):
+            return NotImplemented
+        return all(getattr(self, slot) == getattr(other, slot) for slot in self.__slots__)
+
+    def add_move(self, san: str, move: chess.Move):
+        """Add the next half move, before it is pushed to the board"""
+        # the same few SANs repeat over all games, keep each once
+        self.sans.append(sys.intern(san))
+        self.from_squares.append(move.from_square)
+        self.to_squares.append(move.to_square)
+
+    def add_position(self, board: chess.Board):
+        """Add the position after the last half move added"""
+        self.check_squares.append(board.king(board.turn) if board.is_check() else None)
+        self.snapshots.extend(board_snapshot(board))
+
+    def snapshot(self, ply: int) -> tuple:
+        """Return the snapshot of the position after the half move ply (0 based)"""
+        return tuple(self.snapshots[8 * ply:8 * ply + 8])
+
+    def moves(self) -> list:
+        """Return the chess.Move of each half move"""
+        return [chess.Move(from_square, to_square,
+                           chess.PIECE_SYMBOLS.index(san[san.index('=') + 1].lower())
+                           if '=' in san else None)
+                for san, from_square, to_square
+                in zip(self.sans, self.from_squares, self.to_squares)]
+
+    def position_hashes(self):
+        """Yield the zobrist hash of the position after each half move, replayed
+        on demand, as only the ECO lookup by position needs them"""
+        board = chess.Board(self.first_fen)
+        for move in self.moves():
+            board.push(move)
+            yield chess.polyglot.zobrist_hash(board)
+
+    def turn(self, ply: int) -> chess.Color:
+        """Return the color of the side that makes the half move ply (0 based)"""
+        return self.first_turn if ply % 2 == 0 else not self.first_turn
+
+    def fullmove_number(self, ply: int) -> int:
+        """Return the full move number of the half move ply (0 based)"""
+        return self.first_fullmove + (ply + (self.first_turn == chess.BLACK)) // 2
+
+
+def analyze_moves(moves, board=None) -> GameAnalysis:
+    """Return the analysis of the chess.Move moves, played from the board,
+    by default from the standard start position"""
+    board = chess.Board() if board is None else board.copy(stack=False)
+    game_analysis = GameAnalysis(board)
+    for move in moves:
+        game_analysis.add_move(board.san(move), move)
+        board.push(move)
+        game_analysis.add_position(board)
+    return game_analysis
+
+
+def analyze_pgn(pgn_str: str) -> GameAnalysis:
+    """Return the analysis of the mainline of a pgn game notation, e.g. '1. e4 e5'"""
+    game = chess.pgn.read_game(io.StringIO(pgn_str))
+    return analyze_moves(game.mainline_moves(), game.board())
@@ -0,0 +1,723 @@
+# pylint: disable=import-error
+"""some benchmarks for the pgn2docx modules,
+run e.g. 'python bench.py > bench_output.txt'"""
+
+import io
+import os.path
+import random
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import chess
+import chess.pgn
+import numpy as np
+import pandas as pd
+
+import analysis
+import chessboard as cb
+import eco
+import pgn
+import pgnindex
+
+PGN_DIR = 'PGN'
+
+
+def timed(func, *args, repeat=3) -> float:
+    """Return the best wall clock time in seconds of repeat calls of func(*args)"""
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(*args)
+        elapsed = time.perf_counter() - start
+        if best is None or elapsed < best:
+            best = elapsed
+    return best
+
+
+def gen_annotated_pgnfile(file_name: str, copies=20) -> str:
+    """Return the name of a temporary pgn file with the games of all pgn files
+    at PGN_DIR, copies times, annotated like lichess exports:
+    [%clk]/[%eval] comments at every move and a side variation every 5th move"""
+    out_str = io.StringIO()
+    for pgn_name in pgn.get_pgnfile_names_from_dir(PGN_DIR):
+        with open(pgn_name, 'r', encoding='utf-8') as pgn_file:
+            while True:
+                game = chess.pgn.read_game(pgn_file)
+                if game is None:
+                    break
+                for ply, node in enumerate(game.mainline()):
+                    node.comment = f'[%eval 0.{ply % 10}] [%clk 0:0{ply % 10}:00]'
+                    node.nags.add(chess.pgn.NAG_GOOD_MOVE)
+                    board = node.parent.board()
+                    alternative = next(iter(board.legal_moves))
+                    if ply % 5 == 0 and alternative != node.move:
+                        side = node.parent.add_variation(alternative)
+                        side.comment = '[%eval -1.0]'
+                print(game, file=out_str, end='\n\n')
+    with open(file_name, 'w', encoding='utf-8') as pgn_file:
+        for _ in range(copies):
+            pgn_file.write(out_str.getvalue())
+    return file_name
+
+
+def read_games_with_gamenodes(file_name: str) -> list:
+    """Return the pgn strings of all games, via 'chess.pgn.read_game'
+    and 'variation_san' - the reading before the MainlineVisitor"""
+    pgn_strs = []
+    with open(file_name, 'r', encoding='utf-8') as pgn_file:
+        while True:
+            game = chess.pgn.read_game(pgn_file)
+            if game is None:
+                break
+            pgn_strs.append(game.board().variation_san(game.mainline_moves()))
+    return pgn_strs
+
+
+def read_games_with_mainline_visitor(file_name: str) -> list:
+    """Return the pgn strings of all games, via the lean MainlineVisitor"""
+    return [game.pgn for game in pgn.iter_games_from_pgnfile(file_name)]
+
+
+def bench_read_games():
+    """compare GameNode trees vs. MainlineVisitor on an annotated pgn file"""
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        file_name = gen_annotated_pgnfile(os.path.join(tmp_dir, 'annotated.pgn'))
+        games = len(read_games_with_mainline_visitor(file_name))
+        assert read_games_with_gamenodes(file_name) == \
+            read_games_with_mainline_visitor(file_name)
+        nodes = timed(read_games_with_gamenodes, file_name)
+        lean = timed(read_games_with_mainline_visitor, file_name)
+    print(f'read {games} annotated games')
+    print(f'  chess.pgn.read_game + variation_san: {nodes:8.3f} s')
+    print(f'  pgn.MainlineVisitor:                 {lean:8.3f} s   ({nodes / lean:.1f}x)')
+
+
+def replay_games_before_analysis(file_name: str) -> int:
+    """Return the number of half moves of all games, replayed by python-chess
+    as before the game analysis: read_game + variation_san at parsing,
+    normalize_pgn_string at the ECO lookup and read_game + san + is_check
+    at the diagram preparation"""
+    plies = 0
+    for pgn_str in read_games_with_gamenodes(file_name):
+        eco.normalize_pgn_string(pgn_str)
+        board = chess.Board()
+        for move in chess.pgn.read_game(io.StringIO(pgn_str)).mainline_moves():
+            board.san(move)
+            board.push(move)
+            board.is_check()
+            plies += 1
+    return plies
+
+
+def replay_games_with_analysis(file_name: str) -> int:
+    """Return the number of half moves of all games, replayed once
+    by the MainlineVisitor into their analysis"""
+    return sum(len(game.analysis)
+               for game in pgn.iter_games_from_pgnfile(file_name))
+
+
+def bench_game_analysis():
+    """compare the python-chess time per game: several replays vs. one analysis"""
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        file_name = gen_annotated_pgnfile(os.path.join(tmp_dir, 'annotated.pgn'))
+        games = len(read_games_with_mainline_visitor(file_name))
+        plies = replay_games_with_analysis(file_name)
+        assert replay_games_before_analysis(file_name) == plies
+        before = timed(replay_games_before_analysis, file_name, repeat=1)
+        once = timed(replay_games_with_analysis, file_name)
+    print(f'replay {games} games, {plies} half moves, per game')
+    print(f'  parse, normalize, prep replays: {before / games * 1e3:8.3f} ms')
+    print(f'  one analysis at parsing:        {once / games * 1e3:8.3f} ms'
+          f'   ({before / once:.1f}x)')
+
+
+def gen_long_game(plies=200, seed=1) -> str:
+    """Return the pgn game notation of a game with plies random half moves"""
+    rand = random.Random(seed)
+    board = chess.Board()
+    while board.ply() < plies:
+        moves = [move for move in board.legal_moves
+                 if not board.is_into_check(move)]
+        move = rand.choice(moves)
+        board.push(move)
+        if board.is_game_over():
+            board.pop()
+            if len(moves) == 1:
+                board = chess.Board()
+    return chess.Board().variation_san(board.move_stack)
+
+
+def prep_ttfboards_with_dataframes(game_analysis) -> pd.DataFrame:
+    """Return the full moves of the game as prepared before the move table:
+    DataFrame.append per half move and per full move, and iterrows()"""
+    half_moves_df = pd.DataFrame()
+    for ply, san in enumerate(game_analysis.sans):
+        move_dict = {}
+        move_dict['FMVN'] = game_analysis.fullmove_number(ply)
+        move_dict['SAN'] = san
+        move_dict['sq_from'] = chess.square_name(game_analysis.from_squares[ply])
+        move_dict['sq_to'] = chess.square_name(game_analysis.to_squares[ply])
+        move_dict['player'] = game_analysis.turn(ply)
+        if chess.WHITE == move_dict['player']:
+            move_dict['mv_san_str'] = f"{move_dict['FMVN']}. {san} ... "
+        else:
+            move_dict['mv_san_str'] = f"{move_dict['FMVN']}.  ... {san}"
+        sq_check = ''
+        if game_analysis.check_squares[ply] is not None:
+            sq_check = chess.square_name(game_analysis.check_squares[ply])
+        move_dict['sq_check'] = sq_check
+        move_dict['board_arr'] = cb.board2arr(
+            analysis.snapshot2board(game_analysis.snapshot(ply)))
+        half_moves_df = half_moves_df.append(move_dict, ignore_index=True)
+    half_moves_df = half_moves_df.astype({'FMVN': np.uint8})
+    full_moves_df = pd.DataFrame()
+    full_move_dict = {}
+    for _, hmv in half_moves_df.iterrows():
+        full_move_dict['FMVN'] = int(hmv['FMVN'])
+        side = 'w' if chess.WHITE == hmv['player'] else 'b'
+        full_move_dict[f'{side}_hmv_str'] = hmv['mv_san_str']
+        full_move_dict[f'{side}_sq_from'] = hmv['sq_from']
+        full_move_dict[f'{side}_sq_to'] = hmv['sq_to']
+        full_move_dict[f'{side}_sq_check'] = hmv['sq_check']
+        full_move_dict[f'{side}_board_ttf'] = cb.arr2ttf(hmv['board_arr'])
+        if side == 'b':
+            full_moves_df = full_moves_df.append(full_move_dict, ignore_index=True)
+    return full_moves_df.astype({'FMVN': np.uint8})
+
+
+def traced_peak(func, *args) -> int:
+    """Return the peak of the memory allocated by func(*args), in bytes"""
+    tracemalloc.start()
+    func(*args)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return peak
+
+
+def bench_move_table():
+    """compare the diagram preparation of a 100 moves game: DataFrames vs. move table"""
+    game_analysis = analysis.analyze_pgn(gen_long_game())
+    plies = len(game_analysis)
+    frames = timed(prep_ttfboards_with_dataframes, game_analysis)
+    table = timed(pgn.prep_move_table, game_analysis)
+    print(f'prepare the diagrams of a game with {plies} half moves, per half move')
+    print(f'  DataFrame rows: {frames / plies * 1e6:8.1f} us   '
+          f'{traced_peak(prep_ttfboards_with_dataframes, game_analysis) / plies:8.0f} bytes peak')
+    print(f'  move table:     {table / plies * 1e6:8.1f} us   '
+          f'{traced_peak(pgn.prep_move_table, game_analysis) / plies:8.0f} bytes peak'
+          f'   ({frames / table:.1f}x)')
+
+
+def load_games_as_dataframe(file_name: str) -> list:
+    """Return the games of the file_name as before the game records:
+    one dict per game out of a DataFrame of all games, with NaN for missing tags"""
+    games_df = pd.DataFrame([dict(game.headers, pgn=game.pgn, file=game.file)
+                             for game in pgn.iter_games_from_pgnfile(file_name)])
+    return [games_df.iloc[index].to_dict() for index in range(len(games_df))]
+
+
+def traced_size(func, *args) -> int:
+    """Return the memory still allocated for the result of func(*args), in bytes"""
+    tracemalloc.start()
+    result = func(*args)
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del result
+    return size
+
+
+def load_game_records(file_name: str, keep_analysis=True) -> list:
+    """Return the game records of the file_name, if not keep_analysis without it"""
+    games = list(pgn.iter_games_from_pgnfile(file_name))
+    if not keep_analysis:
+        for game in games:
+            game.analysis = None
+    return games
+
+
+def bench_game_records():
+    """compare the memory per loaded game: DataFrame row dicts vs. game records"""
+    file_names = pgn.get_pgnfile_names_from_dir(PGN_DIR)
+    pgn_size = sum(os.path.getsize(file_name) for file_name in file_names)
+    frames = sum(traced_size(load_games_as_dataframe, file_name)
+                 for file_name in file_names)
+    records = sum(traced_size(load_game_records, file_name, False)
+                  for file_name in file_names)
+    analyzed = sum(traced_size(load_game_records, file_name)
+                   for file_name in file_names)
+    print(f'load the games of {pgn_size} bytes pgn, memory as multiple of the pgn size')
+    print(f'  DataFrame row dicts:          {frames / pgn_size:5.1f}')
+    print(f'  game records:                 {records / pgn_size:5.1f}')
+    print(f'  game records, incl. analysis: {analyzed / pgn_size:5.1f}')
+
+
+def bench_ttf_encoder():
+    """compare the TTF encoding per diagram: board2ttf, arr2ttf, bitboards2ttf
+    vs. patch_ttf of the last diagram"""
+    game_analysis = analysis.analyze_pgn(gen_long_game())
+    boards = [analysis.snapshot2board(game_analysis.snapshot(ply))
+              for ply in range(len(game_analysis))]
+    assert [cb.board2ttf(board) for board in boards] == \
+        [cb.bitboards2ttf(board) for board in boards]
+
+    def encode_all(encode):
+        for board in boards:
+            encode(board)
+
+    def patch_all():
+        ttf_str = cb.bitboards2ttf(boards[0])
+        for old_board, board in zip(boards, boards[1:]):
+            ttf_str = cb.patch_ttf(ttf_str, old_board, board)
+        return ttf_str
+
+    assert patch_all() == cb.board2ttf(boards[-1])
+
+    via_str = timed(encode_all, cb.board2ttf)
+    via_arr = timed(encode_all, lambda board: cb.arr2ttf(cb.board2arr(board)))
+    direct = timed(encode_all, cb.bitboards2ttf)
+    patched = timed(patch_all)
+    print(f'encode {len(boards)} diagrams as TTF string, per diagram')
+    print(f'  board2ttf:              {via_str / len(boards) * 1e6:8.1f} us')
+    print(f'  arr2ttf(board2arr()):   {via_arr / len(boards) * 1e6:8.1f} us')
+    print(f'  bitboards2ttf:          {direct / len(boards) * 1e6:8.1f} us'
+          f'   ({via_arr / direct:.1f}x)')
+    print(f'  patch_ttf:              {patched / len(boards) * 1e6:8.1f} us'
+          f'   ({via_arr / patched:.1f}x)')
+
+
+def bench_position_tensor(copies=100):
+    """compare the TTF diagrams of many games: per diagram patch_ttf,
+    per game and for all games in one batch as position tensor"""
+    games = [game.analysis for pgn_name in pgn.get_pgnfile_names_from_dir(PGN_DIR)
+             for game in pgn.iter_games_from_pgnfile(pgn_name)] * copies
+    plies = sum(len(game_analysis) for game_analysis in games)
+
+    def patch_games():
+        for game_analysis in games:
+            board = analysis.snapshot2board(game_analysis.snapshot(0))
+            ttf_str = cb.bitboards2ttf(board)
+            for ply in range(1, len(game_analysis)):
+                old_board = board
+                board = analysis.snapshot2board(game_analysis.snapshot(ply))
+                ttf_str = cb.patch_ttf(ttf_str, old_board, board)
+
+    def encode_games():
+        for game_analysis in games:
+            cb.codes2ttf(cb.snapshots2codes(
+                np.frombuffer(game_analysis.snapshots, dtype=np.uint64)))
+
+    def encode_batch():
+        snapshots = np.concatenate([np.frombuffer(game_analysis.snapshots, dtype=np.uint64)
+                                    for game_analysis in games])
+        return cb.codes2ttf(cb.snapshots2codes(snapshots))
+
+    assert len(encode_batch()) == plies
+    patched = timed(patch_games, repeat=1)
+    per_game = timed(encode_games, repeat=1)
+    batch = timed(encode_batch, repeat=1)
+    print(f'TTF diagrams of {len(games)} games with {plies} half moves, games per second')
+    print(f'  patch_ttf per half move:   {len(games) / patched:8.0f}')
+    print(f'  position tensor per game:  {len(games) / per_game:8.0f}')
+    print(f'  position tensor, 1 batch:  {len(games) / batch:8.0f}')
+
+
+# the Chess Merida glyph table of the cell codes, before the font registry
+GLYPH_TABLE = np.array([ord(cb.FONT_DICT[key]) for key in cb.CELL_KEYS] + [ord('\n')],
+                       dtype=np.uint8)
+
+# per piece, i.e. (piece type, color), its Chess Merida glyph at each square
+PIECE_GLYPHS_DICT = {
+    (piece_type, color): tuple(
+        cb.FONT_DICT[chess.Piece(piece_type, color).symbol()
+                     + ('w' if chess.BB_SQUARES[square] & chess.BB_LIGHT_SQUARES else 'b')]
+        for square in chess.SQUARES)
+    for piece_type in chess.PIECE_TYPES for color in chess.COLORS}
+
+
+def bitboards2ttf_with_glyph_dict(board: chess.BaseBoard) -> str:
+    """Return the chessboard TTF, glyph by glyph from PIECE_GLYPHS_DICT (the old code)"""
+    ttf_chars = list(cb.EMPTY_WHITE_TTF)
+    for piece_type, pieces in ((chess.PAWN, board.pawns), (chess.KNIGHT, board.knights),
+                               (chess.BISHOP, board.bishops), (chess.ROOK, board.rooks),
+                               (chess.QUEEN, board.queens), (chess.KING, board.kings)):
+        for color in chess.COLORS:
+            glyphs = PIECE_GLYPHS_DICT[piece_type, color]
+            for square in chess.scan_forward(pieces & board.occupied_co[color]):
+                ttf_chars[cb.SQ_2_TTF_POS_W_DICT[square]] = glyphs[square]
+    return ''.join(ttf_chars)
+
+
+def codes2ttf_with_take(codes: np.ndarray) -> list:
+    """Return the TTF strings of the chessboards ndarray (N, 10, 10),
+    looked up with np.take at the glyph table (the old code)"""
+    lines = np.concatenate(
+        (codes, np.full((len(codes), 10, 1), cb.NEWLINE_CODE, dtype=np.uint8)), axis=2)
+    ttf_text = np.take(GLYPH_TABLE, lines).tobytes().decode('latin-1')
+    return [ttf_text[start:start + 110] for start in range(0, len(ttf_text), 110)]
+
+
+def bench_font_tables(copies=100):
+    """compare the glyph lookup of the diagrams: per square from the glyph dict
+    vs. the font's bytes.translate table, and np.take vs. the same table"""
+    game_analysis = analysis.analyze_pgn(gen_long_game())
+    boards = [analysis.snapshot2board(game_analysis.snapshot(ply))
+              for ply in range(len(game_analysis))]
+    assert [bitboards2ttf_with_glyph_dict(board) for board in boards] == \
+        [cb.bitboards2ttf(board, 'Chess Leipzig') for board in boards]
+    codes = cb.snapshots2codes(np.tile(np.frombuffer(game_analysis.snapshots, dtype=np.uint64),
+                                       copies))
+    assert codes2ttf_with_take(codes) == cb.codes2ttf(codes, 'Chess Leipzig')
+
+    def encode_all(encode):
+        for board in boards:
+            encode(board)
+
+    glyph_dict = timed(encode_all, bitboards2ttf_with_glyph_dict)
+    translated = timed(encode_all, cb.bitboards2ttf)
+    take = timed(codes2ttf_with_take, codes)
+    byte_table = timed(cb.codes2ttf, codes)
+    print(f'glyph lookup of {len(boards)} diagrams, resp. {len(codes)} in one batch, per diagram')
+    print(f'  bitboards2ttf, glyph dict:      {glyph_dict / len(boards) * 1e6:8.2f} us')
+    print(f'  bitboards2ttf, bytes.translate: {translated / len(boards) * 1e6:8.2f} us'
+          f'   ({glyph_dict / translated:.1f}x)')
+    print(f'  codes2ttf, np.take:             {take / len(codes) * 1e6:8.2f} us')
+    print(f'  codes2ttf, bytes.translate:     {byte_table / len(codes) * 1e6:8.2f} us'
+          f'   ({take / byte_table:.1f}x)')
+
+
+def snapshots2codes_white_only(snapshots) -> np.ndarray:
+    """Return the chessboards of the snapshots from White view, as ndarray (N, 10, 10)
+    of cell codes, the ranks reversed by slicing (the old code)"""
+    snapshots = np.asarray(snapshots, dtype='<u8').reshape(-1, 8)
+    bits = np.unpackbits(snapshots.view(np.uint8).reshape(-1, 8, 8),
+                         axis=2, bitorder='little')
+    pieces = np.einsum('nps,p->ns', bits[:, :6, :],
+                       np.arange(2, 14, 2, dtype=np.uint8))
+    pieces += bits[:, 6, :]
+    cells = np.take(cb.SQUARE_CODE_TABLE, pieces + cb.SQUARE_CODE_OFFSETS)
+    codes = np.repeat(cb.EMPTY_WHITE_CODES[np.newaxis], len(snapshots), axis=0)
+    codes[:, 1:9, 1:9] = cells.reshape(-1, 8, 8)[:, ::-1, :]
+    return codes
+
+
+def bench_orientation(copies=100):
+    """compare the position tensor from White view by slicing vs. permuted by the
+    orientation's tables, also from Black view and from the side to move;
+    and the Black view by flipping the string boards vs. bitboards2ttf"""
+    game_analysis = analysis.analyze_pgn(gen_long_game())
+    snapshots = np.tile(np.frombuffer(game_analysis.snapshots, dtype=np.uint64), copies)
+    turns = [ply % 2 == 1 for ply in range(len(snapshots) // 8)]
+    assert np.array_equal(snapshots2codes_white_only(snapshots), cb.snapshots2codes(snapshots))
+    boards = [analysis.snapshot2board(game_analysis.snapshot(ply))
+              for ply in range(len(game_analysis))]
+
+    sliced = timed(snapshots2codes_white_only, snapshots)
+    white = timed(cb.snapshots2codes, snapshots, chess.WHITE)
+    black = timed(cb.snapshots2codes, snapshots, chess.BLACK)
+    turn = timed(cb.snapshots2codes, snapshots, turns)
+    flipped = timed(lambda: [cb.arr2ttf(cb.arr_flip(cb.board2arr(board))) for board in boards])
+    bitboards = timed(lambda: [cb.bitboards2ttf(board, orientation=chess.BLACK)
+                               for board in boards])
+    print(f'position tensor of {len(turns)} diagrams, per diagram')
+    print(f'  White view, sliced:              {sliced / len(turns) * 1e6:8.2f} us')
+    print(f'  White view, permuted:            {white / len(turns) * 1e6:8.2f} us')
+    print(f'  Black view, permuted:            {black / len(turns) * 1e6:8.2f} us')
+    print(f'  side to move, permuted:          {turn / len(turns) * 1e6:8.2f} us')
+    print(f'Black view of {len(boards)} diagrams, per diagram')
+    print(f'  arr2ttf(arr_flip(board2arr())):  {flipped / len(boards) * 1e6:8.1f} us')
+    print(f'  bitboards2ttf:                   {bitboards / len(boards) * 1e6:8.1f} us')
+
+
+def gen_book_games(games=100, plies=40, book_lines=20, eco_prefix='B', seed=1) -> list:
+    """Return the analysis of games, each one of book_lines lines of the ECO codes
+    starting with eco_prefix, e.g. the Sicilians, continued by random moves"""
+    rand = random.Random(seed)
+    lines = rand.sample([record['pgn'] for record in eco.get_eco_data().records
+                         if record['eco'].startswith(eco_prefix)], book_lines)
+    analyses = []
+    for _ in range(games):
+        game = chess.pgn.read_game(io.StringIO(rand.choice(lines)))
+        board = game.end().board()
+        while board.ply() < plies and not board.is_game_over():
+            board.push(rand.choice(list(board.legal_moves)))
+        analyses.append(analysis.analyze_moves(board.move_stack))
+    return analyses
+
+
+def bench_diagram_cache():
+    """compare the diagrams of games with book openings: no cache vs. diagram cache"""
+    games = gen_book_games()
+    plies = sum(len(game_analysis) for game_analysis in games)
+
+    cache = cb.DiagramCache(0)
+
+    def prep_all():
+        for game_analysis in games:
+            pgn.prep_move_table(game_analysis, diagram_cache=cache)
+
+    uncached = timed(prep_all, repeat=1)
+    cache = cb.DiagramCache(4096)
+    cached = timed(prep_all, repeat=1)
+    print(f'prepare the diagrams of {len(games)} games with Sicilian openings, '
+          f'{plies} half moves')
+    print(f'  no cache:      {uncached:8.3f} s')
+    print(f'  diagram cache: {cached:8.3f} s   ({uncached / cached:.1f}x)')
+    print(f'  {cache.stats()}')
+
+
+def divide_ttf_str_with_dataframe(ttf_str: str,
+                                  sq_check: str,
+                                  sq_from: str,
+                                  sq_to: str) -> pd.DataFrame:
+    """Return the parts of the ttf str as before split_ttf_str():
+    walked char by char, with DataFrame.append per part"""
+    pos2mark_dict = {}
+    if sq_check != '':
+        pos2mark_dict[cb.get_linear_pos(sq_check)] = 'sq_check'
+    if sq_from != '':
+        pos2mark_dict[cb.get_linear_pos(sq_from)] = 'sq_from'
+    if sq_to != '':
+        pos2mark_dict[cb.get_linear_pos(sq_to)] = 'sq_to'
+
+    ttf_str_df = pd.DataFrame()
+    # ttf starts always 'norm'
+    ttf_str_dict = {'type': 'norm'}
+    ttf_part = ''
+    for index, ttf_char in enumerate(ttf_str):
+        if index in pos2mark_dict:
+            # close the old str
+            ttf_str_dict['part'] = ttf_part
+            if ttf_str_dict['part'] != '':
+                ttf_str_df = ttf_str_df.append(ttf_str_dict, ignore_index=True)
+            # put the new char - only one char
+            ttf_part = ttf_char
+            ttf_str_dict['part'] = ttf_part
+            ttf_str_dict['type'] = pos2mark_dict[index]
+            ttf_str_df = ttf_str_df.append(ttf_str_dict, ignore_index=True)
+            ttf_part = ''
+            ttf_str_dict = {'type': 'norm'}
+        else:
+            ttf_part += ttf_char
+    ttf_str_dict['part'] = ttf_part
+    ttf_str_df = ttf_str_df.append(ttf_str_dict, ignore_index=True)
+    return ttf_str_df
+
+
+def bench_split_ttf_str():
+    """compare the diagram segmentation: DataFrame parts vs. split_ttf_str tuples"""
+    move_table = pgn.prep_move_table(analysis.analyze_pgn(gen_long_game()))
+    diagrams = [(full_move.w_board_ttf[:-1], full_move.w_sq_check,
+                 full_move.w_sq_from, full_move.w_sq_to) for full_move in move_table] + \
+        [(full_move.b_board_ttf[:-1], full_move.b_sq_check,
+          full_move.b_sq_from, full_move.b_sq_to) for full_move in move_table]
+    for diagram in diagrams:
+        parts_df = divide_ttf_str_with_dataframe(*diagram)
+        assert tuple(zip(parts_df['part'], parts_df['type'])) == cb.split_ttf_str(*diagram)
+
+    def split_all(split):
+        for diagram in diagrams:
+            split(*diagram)
+
+    frames = timed(split_all, divide_ttf_str_with_dataframe, repeat=1)
+    tuples = timed(split_all, cb.split_ttf_str)
+    print(f'segment {len(diagrams)} diagrams by their marked squares, per diagram')
+    print(f'  DataFrame.append:  {frames / len(diagrams) * 1e6:8.1f} us')
+    print(f'  split_ttf_str:     {tuples / len(diagrams) * 1e6:8.1f} us'
+          f'   ({frames / tuples:.0f}x)')
+
+
+def bench_compressed():
+    """compare reading and indexing plain vs. compressed pgn files"""
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        file_name = gen_annotated_pgnfile(os.path.join(tmp_dir, 'games.pgn'))
+        with open(file_name, 'rb') as pgn_file:
+            pgn_bytes = pgn_file.read()
+        file_names = {'': file_name}
+        for ext, module in pgnindex.COMPRESSION_DICT.items():
+            file_names[ext] = file_name + ext
+            with module.open(file_names[ext], 'wb') as comp_file:
+                comp_file.write(pgn_bytes)
+        print(f'read {len(pgn_bytes) / 1e6:.1f} MB pgn')
+        for ext, name in file_names.items():
+            read = timed(read_games_with_mainline_visitor, name, repeat=1)
+            index = timed(pgnindex.build_index, name)
+            print(f'  {"plain" if ext == "" else ext:6s} '
+                  f'{os.path.getsize(name) / 1e6:6.2f} MB   '
+                  f'games: {len(pgn_bytes) / 1e6 / read:6.2f} MB/s   '
+                  f'index: {len(pgn_bytes) / 1e6 / index:7.1f} MB/s')
+
+
+def get_game_by_csv_index(file_name: str, number: int) -> str:
+    """Return the pgn text of game number, its offset read from the whole index
+    as csv sidecar (the old code)"""
+    index_df = pd.read_csv(file_name + '.csv', keep_default_na=False)
+    with pgnindex.open_pgn_bytes(file_name) as pgn_bytes:
+        return pgnindex.read_game_text(pgn_bytes, int(index_df['offset'][number]),
+                                       int(index_df['length'][number])).getvalue()
+
+
+def bench_index_access(copies=10000):
+    """compare the random access to one game of a large pgn file:
+    its offset read from the csv index vs. from the memory-mapped index"""
+    pgn_str = ''
+    for pgn_name in pgn.get_pgnfile_names_from_dir(PGN_DIR):
+        with open(pgn_name, 'r', encoding='utf-8') as pgn_file:
+            pgn_str += pgn_file.read().rstrip('\n') + '\n\n'
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        file_name = os.path.join(tmp_dir, 'games.pgn')
+        with open(file_name, 'w', encoding='utf-8') as pgn_file:
+            pgn_file.write(pgn_str * copies)
+        build = timed(pgnindex.load_index, file_name, True, repeat=1)
+        index_df = pgnindex.load_index(file_name)
+        index_df.to_csv(file_name + '.csv', index=False)
+        number = len(index_df) * 3 // 4
+        assert get_game_by_csv_index(file_name, number).startswith('[Event')
+        via_csv = timed(get_game_by_csv_index, file_name, number)
+        via_map = timed(pgn.get_game_from_pgnfile, file_name, number)
+        print(f'index of {len(index_df)} games, {os.path.getsize(file_name) / 1e6:.0f} MB pgn')
+        print(f'  build:                       {build:8.2f} s')
+        print(f'  game {number}, csv index:     {via_csv * 1e3:8.1f} ms')
+        print(f'  game {number}, mapped index:  {via_map * 1e3:8.1f} ms')
+
+
+def get_eco_data_by_sorted_scan(eco_df, eco_code: str, pgn_str: str) -> dict:
+    """Return the ECO data as found before the ECO trie:
+    a scan over the reverse sorted ECO DataFrame per game"""
+    pgn_str = eco.normalize_pgn_string(pgn_str)
+    found_eco_dict = {}
+    if eco_code != '':
+        filtered_eco_data_df = eco_df[eco_code == eco_df['eco']]
+        for _, row in filtered_eco_data_df.sort_values('pgn', ascending=False).iterrows():
+            if row['pgn'] == pgn_str[:len(row['pgn'])]:
+                found_eco_dict = row.to_dict()
+                break
+    if not bool(found_eco_dict):
+        for _, row in eco_df.sort_values('pgn', ascending=False).iterrows():
+            if row['pgn'] == pgn_str[:len(row['pgn'])]:
+                found_eco_dict = row.to_dict()
+                break
+    return found_eco_dict
+
+
+def bench_eco_lookup():
+    """compare the ECO lookup per game: sorted DataFrame scan vs. ECO trie"""
+    games = [(game.headers.get('ECO', ''), game.pgn)
+             for pgn_name in pgn.get_pgnfile_names_from_dir(PGN_DIR)
+             for game in pgn.iter_games_from_pgnfile(pgn_name)]
+    eco_df = eco.read_eco_csv()
+    for eco_code, pgn_str in games:
+        eco_dict = eco.new_get_eco_data_for(eco=eco_code, pgn=pgn_str)
+        eco_dict.pop('ttf', None)
+        # repr, as NaN != NaN
+        assert repr(get_eco_data_by_sorted_scan(eco_df, eco_code, pgn_str)) == \
+            repr(eco_dict)
+    sans_list = [eco.pgn2sans(eco.normalize_pgn_string(pgn_str)) for _, pgn_str in games]
+
+    def scan_all():
+        for eco_code, pgn_str in games:
+            get_eco_data_by_sorted_scan(eco_df, eco_code, pgn_str)
+
+    def trie_all():
+        for (eco_code, _), sans in zip(games, sans_list):
+            eco.get_eco_data_for_sans(sans, eco_code)
+
+    scan = timed(scan_all, repeat=1) / len(games)
+    trie = timed(trie_all) / len(games)
+    print(f'ECO lookup of {len(games)} games, per game')
+    print(f'  sorted DataFrame scan: {scan * 1e3:8.3f} ms')
+    print(f'  ECO trie walk:         {trie * 1e6:8.3f} us   ({scan / trie:.0f}x)')
+
+
+def bench_eco_batch(games=10000):
+    """compare the ECO lookup of many games: one by one vs. batch"""
+    # the openings of the ECO database as stand-in for the games of a large database
+    records = eco.get_eco_data().records
+    pgn_strs = [records[number % len(records)]['pgn'] for number in range(games)]
+    sans_list = [eco.pgn2sans(eco.normalize_pgn_string(pgn_str)) for pgn_str in pgn_strs]
+    game_list = [chess.pgn.read_game(io.StringIO(pgn_str)) for pgn_str in pgn_strs]
+
+    def one_by_one_pgn():
+        return [eco.new_get_eco_data_for(eco='', pgn=pgn_str) for pgn_str in pgn_strs]
+
+    def one_by_one_sans():
+        return [eco.get_eco_data_for_sans(sans) for sans in sans_list]
+
+    assert repr(one_by_one_pgn()) == repr(eco.get_eco_data_for_games(game_list))
+    assert repr(one_by_one_sans()) == repr(eco.get_eco_data_for_games(sans_list))
+    pgn_time = timed(one_by_one_pgn, repeat=1)
+    sans_time = timed(one_by_one_sans)
+    games_time = timed(eco.get_eco_data_for_games, game_list)
+    batch_time = timed(eco.get_eco_data_for_games, sans_list)
+    print(f'ECO lookup of {games} games')
+    print(f'  one by one, pgn strings:   {pgn_time:8.3f} s')
+    print(f'  batch, chess.pgn.Game:     {games_time:8.3f} s   ({pgn_time / games_time:.0f}x)')
+    print(f'  one by one, SAN lists:     {sans_time:8.3f} s')
+    print(f'  batch, SAN lists:          {batch_time:8.3f} s')
+
+
+# the first ECO lookup of a fresh process before the ECO snapshot (the old code):
+# pandas and the read of eco.csv at import, then the sorted DataFrame scan
+ECO_COLD_START_OLD = '''
+import chess.pgn
+import pandas as pd
+import eco
+eco_df = pd.read_csv(eco.NEW_ECO_FILENAME, usecols=eco.NEW_ECO_COLUMNS)
+pgn_str = eco.normalize_pgn_string(eco.ECO_TEST_DATA_DICT['pgn'])
+rows = eco_df[eco_df['eco'] == eco.ECO_TEST_DATA_DICT['eco']]
+for _, row in rows.sort_values('pgn', ascending=False).iterrows():
+    if row['pgn'] == pgn_str[:len(row['pgn'])]:
+        break
+'''
+ECO_COLD_START_NEW = 'import eco; eco.new_get_eco_data_for(**eco.ECO_TEST_DATA_DICT)'
+
+
+def bench_eco_cold_start():
+    """compare the first ECO lookup of a fresh process:
+    the old code vs. the ECO snapshot"""
+    snapshot_name = eco.get_snapshot_filename(eco.NEW_ECO_FILENAME)
+
+    def run(code):
+        subprocess.run([sys.executable, '-c', code], check=True)
+
+    def compile_snapshot():
+        if os.path.isfile(snapshot_name):
+            os.remove(snapshot_name)
+        run(ECO_COLD_START_NEW)
+
+    python_only = timed(run, 'pass')
+    import_only = timed(run, 'import eco')
+    old = timed(run, ECO_COLD_START_OLD)
+    compiled = timed(compile_snapshot, repeat=1)
+    loaded = timed(run, ECO_COLD_START_NEW)
+    print('first ECO lookup of a fresh process, incl. interpreter start')
+    print(f'  interpreter only:         {python_only:8.3f} s')
+    print(f'  import eco only:          {import_only:8.3f} s')
+    print(f'  old code, csv and scan:   {old:8.3f} s')
+    print(f'  compile eco.csv.snapshot: {compiled:8.3f} s   (once)')
+    print(f'  load eco.csv.snapshot:    {loaded:8.3f} s   ({old / loaded:.1f}x)')
+
+
+def main():
+    """run all benchmarks"""
+    bench_read_games()
+    bench_game_analysis()
+    bench_move_table()
+    bench_game_records()
+    bench_ttf_encoder()
+    bench_position_tensor()
+    bench_font_tables()
+    bench_orientation()
+    bench_diagram_cache()
+    bench_split_ttf_str()
+    bench_compressed()
+    bench_index_access()
+    bench_eco_lookup()
+    bench_eco_batch()
+    bench_eco_cold_start()
+
+
+if __name__ == '__main__':
+    main()
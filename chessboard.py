@@ -1,6 +1,8 @@
 # pylint: disable=import-error
 """functions for chessboard mgmt, and TTF mapping"""
-import pandas as pd
+import collections
+import os
+import pickle
 
 import chess
 import numpy as np
@@ -218,7 +220,7 @@ def str2ttf(cb_str: str) -> str:
     for x_coord in range(10):
         line = ''
         for y_coord in range(10):
-            line += FONT_DICT[cb_arr[x_coord, y_coord]].format('b')
+            line += FONT_DICT[cb_arr[x_coord, y_coord]]
         cb_ttf_str += line + '\n'
     return cb_ttf_str
 
@@ -229,7 +231,7 @@ def arr2ttf(cb_arr: np.ndarray) -> str:
     for x_coord in range(10):
         line = ''
         for y_coord in range(10):
-            line += FONT_DICT[str(cb_arr[x_coord, y_coord])].format('b')
+            line += FONT_DICT[str(cb_arr[x_coord, y_coord])]
         cb_ttf_str += line + '\n'
     return cb_ttf_str
 
@@ -274,8 +276,9 @@ EMPTY_WHITE_STR = arr2str(EMPTY_WHITE_ARR)
 EMPTY_BLACK_STR = arr2str(EMPTY_BLACK_ARR)
 
 
-def board2arr(board: chess.Board) -> np.ndarray:
-    """Return the chessboard ndarray from a 'chess.board'"""
+def board2arr(board: chess.Board, orientation=chess.WHITE) -> np.ndarray:
+    """Return the chessboard ndarray from a 'chess.board',
+    from White view, or from Black view with orientation chess.BLACK"""
     # the chessboard from White view
     # with
     #   ranks: 8 7 6 5 4 3 2 1
@@ -289,8 +292,7 @@ def board2arr(board: chess.Board) -> np.ndarray:
     #   (10, 10) bottom right
 
     # as PGN printouts are usually from white perspective
-    # this is a reasonable assumption
-    orientation = chess.WHITE
+    # this is the default orientation
     board_arr = np.full((8, 8), '_')
     for square, _ in enumerate(chess.BB_SQUARES):
         # a1 b1 c1 ... h1,
@@ -313,7 +315,7 @@ def board2arr(board: chess.Board) -> np.ndarray:
                 board_arr[x_coord, y_coord] = piece_char
 
     # print(board_arr)
-    out_arr = (EMPTY_WHITE_ARR).tolist()
+    out_arr = (EMPTY_WHITE_ARR if orientation else EMPTY_BLACK_ARR).tolist()
     # print(out_arr)
     # put into an empty board
     for rank in range(8):
@@ -325,14 +327,14 @@ def board2arr(board: chess.Board) -> np.ndarray:
     return np.array(out_arr)
 
 
-def board2str(board: chess.Board) -> str:
+def board2str(board: chess.Board, orientation=chess.WHITE) -> str:
     """Return the chessboard str from a 'chess.board'"""
-    return arr2str(board2arr(board))
+    return arr2str(board2arr(board, orientation))
 
 
-def board2ttf(board: chess.Board) -> str:
+def board2ttf(board: chess.Board, orientation=chess.WHITE) -> str:
     """Return the chessboard TTF from a 'chess.board'"""
-    return str2ttf(arr2str(board2arr(board)))
+    return str2ttf(arr2str(board2arr(board, orientation)))
 
 # mapping: chess.parse_square(square) to ttf_str position
 SQ_2_TTF_POS_W_DICT = { \
@@ -345,9 +347,18 @@ SQ_2_TTF_POS_W_DICT = { \
     8 : 78, 9 : 79, 10 : 80, 11 : 81, 12 : 82, 13 : 83, 14 : 84, 15 : 85, \
     0 : 89, 1 : 90, 2 : 91, 3 : 92, 4 : 93, 5 : 94, 6 : 95, 7 : 96}
 
-def get_linear_pos(square: str) -> int:
+# mapping for the chessboard from Black view, i.e. turned by 180 degrees:
+# a square is where its point reflection at the board's center is from White view
+SQ_2_TTF_POS_B_DICT = {square: SQ_2_TTF_POS_W_DICT[63 - square] for square in chess.SQUARES}
+
+# the mappings by orientation
+SQ_2_TTF_POS_DICT = {chess.WHITE: SQ_2_TTF_POS_W_DICT,
+                     chess.BLACK: SQ_2_TTF_POS_B_DICT}
+
+def get_linear_pos(square: str, orientation=chess.WHITE) -> int:
     """returns the linear pos of a given
-    square at the ttf_str, that has borders"""
+    square at the ttf_str, that has borders,
+    of the chessboard from White view, or from Black view"""
     # example chessboard (here as array)
     # with
     #   sq_from -> sq_to
@@ -391,51 +402,427 @@ def get_linear_pos(square: str) -> int:
     #
     # bl a- b- c- d- e- f- g- h- br     9
     #
-    return SQ_2_TTF_POS_W_DICT[chess.parse_square(square)]
+    return SQ_2_TTF_POS_DICT[orientation][chess.parse_square(square)]
+
+
+# the empty chessboard from White view - as TTF string
+EMPTY_WHITE_TTF = arr2ttf(EMPTY_WHITE_ARR)
+
+
+# numeric chessboards: one uint8 code per cell, i.e. per FONT_DICT key;
+# a game's diagrams are an ndarray (N, 10, 10) of these codes
+CELL_KEYS = tuple(FONT_DICT.keys())
+
+CELL_CODE_DICT = {key: code for code, key in enumerate(CELL_KEYS)}
+
+# the code of the line end, only used at the TTF string
+NEWLINE_CODE = len(CELL_KEYS)
+
+
+def arr2codes(cb_arr: np.ndarray) -> np.ndarray:
+    """Return the chessboard ndarray of cell strings, e.g. 'Kw',
+    as ndarray of their uint8 codes"""
+    return np.array([CELL_CODE_DICT[str(cell)] for cell in np.ravel(cb_arr)],
+                    dtype=np.uint8).reshape(np.shape(cb_arr))
+
+
+def codes2arr(codes: np.ndarray) -> np.ndarray:
+    """Return the chessboard ndarray of codes as ndarray of cell strings"""
+    return np.array(CELL_KEYS)[codes]
+
+
+EMPTY_WHITE_CODES = arr2codes(EMPTY_WHITE_ARR)
+
+EMPTY_BLACK_CODES = arr2codes(EMPTY_BLACK_ARR)
+
+# the empty chessboards by orientation, chess.BLACK (0) and chess.WHITE (1)
+EMPTY_CODES = np.stack((EMPTY_BLACK_CODES, EMPTY_WHITE_CODES))
+
+# the permutation tables by orientation: the square shown at each cell
+# of the chessboard without its borders, row by row
+CELL_SQUARES = np.stack((
+    np.array([63 - square for square in chess.SQUARES_180], dtype=np.intp),
+    np.array(chess.SQUARES_180, dtype=np.intp)))
+
+
+def _square_code_table() -> np.ndarray:
+    """Return the cell code per square and piece, as ndarray (64, 14),
+    the piece given as 2 * piece type + color, piece type 0 for none"""
+    table = np.zeros((64, 14), dtype=np.uint8)
+    for square in chess.SQUARES:
+        square_color = 'w' if chess.BB_SQUARES[square] & chess.BB_LIGHT_SQUARES else 'b'
+        table[square, 0:2] = CELL_CODE_DICT['-' + square_color]
+        for piece_type in chess.PIECE_TYPES:
+            for color in chess.COLORS:
+                key = chess.Piece(piece_type, color).symbol() + square_color
+                table[square, 2 * piece_type + color] = CELL_CODE_DICT[key]
+    return table
+
+
+SQUARE_CODE_TABLE = _square_code_table()
+
+# the offset of each square's row at the flat SQUARE_CODE_TABLE
+SQUARE_CODE_OFFSETS = np.arange(0, 64 * 14, 14)
+
+# by orientation, the offset of each cell's square at the flat SQUARE_CODE_TABLE,
+# i.e. the SQUARE_CODE_OFFSETS permuted by CELL_SQUARES
+CELL_CODE_OFFSETS = SQUARE_CODE_OFFSETS[CELL_SQUARES]
+
+# per piece, as 2 * piece type + color, the cell code at each square a1 ... h8, as char
+SQUARE_CODE_CHARS = tuple(tuple(chr(code) for code in SQUARE_CODE_TABLE[:, piece])
+                          for piece in range(14))
+
+# the empty chessboards by orientation - as str of cell codes, incl. line ends
+EMPTY_CODE_STR_DICT = {
+    orientation: ''.join(''.join(chr(code) for code in row) + chr(NEWLINE_CODE)
+                         for row in EMPTY_CODES[int(orientation)])
+    for orientation in chess.COLORS}
+
+
+# the font registry ----------------------------------
+
+# FONT_DICT keys not used at the diagrams, a font may lack their glyphs
+OPTIONAL_CELL_KEYS = ('|x', 'fk', 'fq', 'fr', 'fb', 'fn', 'fp')
+
+# the glyph of a font's missing optional cell
+MISSING_GLYPH = '?'
+
+
+class FontError(Exception):
+    """A chess TTF can not be registered, e.g. as glyphs are missing,
+    or is not registered"""
+
+
+class ChessFont:
+    """A registered chess TTF: its glyph map, per FONT_DICT key its glyph,
+    compiled into lookup tables from the cell codes to the glyphs,
+    for bytes.translate, and per piece and square"""
+    __slots__ = ('name', 'file_name', 'glyph_dict', 'glyphs',
+                 'byte_table', 'square_glyphs')
+
+    def __init__(self, name: str, file_name: str, glyph_dict: dict):
+        self.name = name
+        self.file_name = file_name
+        self.glyph_dict = glyph_dict
+        # per cell code its glyph, incl. the line end
+        self.glyphs = tuple(glyph_dict.get(key, MISSING_GLYPH) for key in CELL_KEYS) + ('\n',)
+        self.byte_table = bytes(ord(glyph) for glyph in self.glyphs) + \
+            bytes(256 - len(self.glyphs))
+        # per piece, as 2 * piece type + color, its glyph at each square a1 ... h8
+        self.square_glyphs = tuple(tuple(self.glyphs[ord(char)] for char in code_chars)
+                                   for code_chars in SQUARE_CODE_CHARS)
+
+
+# the registered fonts by their names, see register_font()
+FONT_REGISTRY = {}
+
+
+def register_font(ttf_font_name: str, file_name: str, glyph_dict=None) -> ChessFont:
+    """Return the chess TTF ttf_font_name of the file_name, after it is registered
+    with its glyph map glyph_dict, by default FONT_DICT;
+    raise FontError if a glyph used at the diagrams is missing,
+    or a glyph is no single latin-1 char"""
+    if glyph_dict is None:
+        glyph_dict = FONT_DICT
+    missing = [key for key in CELL_KEYS
+               if key not in glyph_dict and key not in OPTIONAL_CELL_KEYS]
+    if missing:
+        raise FontError(f'font \'{ttf_font_name}\' lacks the glyphs of: {", ".join(missing)}')
+    invalid = [key for key, glyph in glyph_dict.items()
+               if len(glyph) != 1 or ord(glyph) > 0xff]
+    if invalid:
+        raise FontError(f'font \'{ttf_font_name}\' has no single latin-1 glyph for: '
+                        f'{", ".join(invalid)}')
+    FONT_REGISTRY[ttf_font_name] = ChessFont(ttf_font_name, file_name, dict(glyph_dict))
+    return FONT_REGISTRY[ttf_font_name]
+
+
+def get_font(ttf_font_name: str) -> ChessFont:
+    """Return the registered chess TTF ttf_font_name, raise FontError if not registered"""
+    try:
+        return FONT_REGISTRY[ttf_font_name]
+    except KeyError:
+        raise FontError(f'font \'{ttf_font_name}\' is not registered, choose one of: '
+                        f'{", ".join(FONT_REGISTRY)}') from None
+
+
+for _ttf_font_name, _file_name in TTF_DICT.items():
+    if _ttf_font_name == 'Chess Leipzig':
+        # the standard border right, marking the side to move, is missing
+        register_font(_ttf_font_name, _file_name,
+                      {key: glyph for key, glyph in FONT_DICT.items() if key != '|x'})
+    else:
+        register_font(_ttf_font_name, _file_name)
+
+
+# the TTF diagrams -----------------------------------
+
+def bitboards2ttf(board: chess.BaseBoard, ttf_font_name='Chess Merida',
+                  orientation=chess.WHITE) -> str:
+    """Return the chessboard TTF from a 'chess.board',
+    the same as board2ttf(), but put straight from the board's bitboards
+    into the empty board of cell codes, square by square,
+    translated into the font's glyphs at once, with its byte table"""
+    sq_2_ttf_pos_dict = SQ_2_TTF_POS_DICT[orientation]
+    code_chars = list(EMPTY_CODE_STR_DICT[orientation])
+    for piece_type, pieces in ((chess.PAWN, board.pawns), (chess.KNIGHT, board.knights),
+                               (chess.BISHOP, board.bishops), (chess.ROOK, board.rooks),
+                               (chess.QUEEN, board.queens), (chess.KING, board.kings)):
+        for color in chess.COLORS:
+            square_code_chars = SQUARE_CODE_CHARS[2 * piece_type + color]
+            for square in chess.scan_forward(pieces & board.occupied_co[color]):
+                code_chars[sq_2_ttf_pos_dict[square]] = square_code_chars[square]
+    byte_table = get_font(ttf_font_name).byte_table
+    return ''.join(code_chars).encode('latin-1').translate(byte_table).decode('latin-1')
+
+
+def patch_ttf(ttf_str: str, old_board: chess.BaseBoard, board: chess.BaseBoard,
+              ttf_font_name='Chess Merida', orientation=chess.WHITE) -> str:
+    """Return the chessboard TTF of the board, out of the TTF string
+    of the old_board, e.g. the position before the last move,
+    by patching only the squares that changed, 2 ... 4 per move"""
+    sq_2_ttf_pos_dict = SQ_2_TTF_POS_DICT[orientation]
+    square_glyphs = get_font(ttf_font_name).square_glyphs
+    changed = 0
+    for old_pieces, pieces in ((old_board.pawns, board.pawns),
+                               (old_board.knights, board.knights),
+                               (old_board.bishops, board.bishops),
+                               (old_board.rooks, board.rooks),
+                               (old_board.queens, board.queens),
+                               (old_board.kings, board.kings),
+                               (old_board.occupied_co[chess.WHITE],
+                                board.occupied_co[chess.WHITE])):
+        changed |= old_pieces ^ pieces
+    ttf_parts = []
+    start = 0
+    for square in sorted(chess.scan_forward(changed), key=sq_2_ttf_pos_dict.get):
+        pos = sq_2_ttf_pos_dict[square]
+        piece_type = board.piece_type_at(square)
+        if piece_type is None:
+            piece = 0
+        else:
+            piece = 2 * piece_type + bool(board.occupied_co[chess.WHITE] & chess.BB_SQUARES[square])
+        ttf_parts.append(ttf_str[start:pos])
+        ttf_parts.append(square_glyphs[piece][square])
+        start = pos + 1
+    ttf_parts.append(ttf_str[start:])
+    return ''.join(ttf_parts)
+
+
+def _snapshots2cells(snapshots: np.ndarray, orientation: chess.Color) -> np.ndarray:
+    """Return the cell codes of the squares of the snapshots (N, 8),
+    as ndarray (N, 8, 8), from the view of orientation"""
+    # bit number square of each bitboard, (N, 8, 64), already in the order of the cells,
+    # i.e. of CELL_SQUARES, by the order of the bytes, the ranks, and of their bits, the files
+    rank_bytes = snapshots.view(np.uint8).reshape(-1, 8, 8)
+    if orientation == chess.WHITE:
+        # ranks 8 ... 1, files a ... h
+        bits = np.unpackbits(rank_bytes[:, :, ::-1], axis=2, bitorder='little')
+    else:
+        # ranks 1 ... 8, files h ... a
+        bits = np.unpackbits(rank_bytes, axis=2, bitorder='big')
+    # the piece at each cell, (N, 64), as 2 * piece type + color
+    pieces = np.einsum('nps,p->ns', bits[:, :6, :],
+                       np.arange(2, 14, 2, dtype=np.uint8))
+    pieces += bits[:, 6, :]
+    cells = np.take(SQUARE_CODE_TABLE, pieces + CELL_CODE_OFFSETS[int(orientation)])
+    return cells.reshape(-1, 8, 8)
+
+
+def snapshots2codes(snapshots, orientations=chess.WHITE) -> np.ndarray:
+    """Return the chessboards of all positions given by their bitboards
+    (pawns, knights, bishops, rooks, queens, kings, white, black), one row each,
+    as ndarray (N, 10, 10) of cell codes, encoded in one batch;
+    all from the view of orientations, or each from the view of its orientation"""
+    snapshots = np.asarray(snapshots, dtype='<u8').reshape(-1, 8)
+    orientations = np.asarray(orientations, dtype=bool)
+    if orientations.ndim == 0:
+        codes = np.repeat(EMPTY_CODES[int(orientations)][np.newaxis], len(snapshots), axis=0)
+        codes[:, 1:9, 1:9] = _snapshots2cells(snapshots, bool(orientations))
+        return codes
+    codes = EMPTY_CODES[orientations.astype(np.intp)]
+    for orientation in chess.COLORS:
+        rows = np.flatnonzero(orientations == orientation)
+        if len(rows) > 0:
+            codes[rows, 1:9, 1:9] = _snapshots2cells(snapshots[rows], orientation)
+    return codes
+
+
+def board2codes(board: chess.BaseBoard, orientation=chess.WHITE) -> np.ndarray:
+    """Return the chessboard of a 'chess.board' as ndarray (10, 10) of cell codes"""
+    return snapshots2codes([board.pawns, board.knights, board.bishops,
+                            board.rooks, board.queens, board.kings,
+                            board.occupied_co[chess.WHITE],
+                            board.occupied_co[chess.BLACK]], orientation)[0]
+
+
+def codes2ttf(codes: np.ndarray, ttf_font_name='Chess Merida'):
+    """Return the chessboard ndarray (10, 10) of codes as TTF string,
+    or the list of TTF strings of the chessboards ndarray (N, 10, 10),
+    all glyphs translated at once with the font's byte table"""
+    codes = np.asarray(codes)
+    lines = np.concatenate(
+        (codes.reshape(-1, 10, 10),
+         np.full((codes.size // 100, 10, 1), NEWLINE_CODE, dtype=np.uint8)),
+        axis=2)
+    byte_table = get_font(ttf_font_name).byte_table
+    ttf_text = lines.astype(np.uint8, copy=False).tobytes().translate(byte_table).decode('latin-1')
+    ttf_strs = [ttf_text[start:start + 110] for start in range(0, len(ttf_text), 110)]
+    return ttf_strs[0] if codes.ndim == 2 else ttf_strs
+
+
+def codes_flip(codes: np.ndarray) -> np.ndarray:
+    """Return the chessboard(s) ndarray (..., 10, 10) of codes
+    as flipped ndarray, see arr_flip()"""
+    codes_flipped = codes.copy()
+    # flip the squares
+    codes_flipped[..., 1:9, 1:9] = codes[..., 8:0:-1, 8:0:-1]
+    # flip left border's file names
+    codes_flipped[..., 1:9, 0] = codes[..., 8:0:-1, 0]
+    # flip bottom border's rank names
+    codes_flipped[..., 9, 1:9] = codes[..., 9, 8:0:-1]
+    return codes_flipped
+
+
+def codes_isflipped(codes1: np.ndarray, codes2: np.ndarray) -> bool:
+    """Return the comparism of 2 chessboards'
+       ndarrays of codes, if the 2nd is identical
+       but flipped to the 1st"""
+    return np.array_equal(codes1, codes_flip(codes2))
+
+
+def split_ttf_str(ttf_str: str,
+                  sq_check: str,
+                  sq_from: str,
+                  sq_to: str,
+                  orientation=chess.WHITE) -> tuple:
+    """Return the ttf str split into at most 7 (part, type) tuples,
+    with type 'norm' for the parts to be printed normally,
+    'sq_check', 'sq_from' or 'sq_to' for the single marked squares;
+    sliced at the sorted positions of the marked squares
+    at the chessboard from the view of orientation"""
+    pos2mark_dict = {}
+    if sq_check != '':
+        pos2mark_dict[get_linear_pos(sq_check, orientation)] = 'sq_check'
+    if sq_from != '':
+        pos2mark_dict[get_linear_pos(sq_from, orientation)] = 'sq_from'
+    if sq_to != '':
+        pos2mark_dict[get_linear_pos(sq_to, orientation)] = 'sq_to'
+    ttf_parts = []
+    start = 0
+    for pos in sorted(pos2mark_dict):
+        if pos > start:
+            ttf_parts.append((ttf_str[start:pos], 'norm'))
+        ttf_parts.append((ttf_str[pos], pos2mark_dict[pos]))
+        start = pos + 1
+    # ttf ends allways 'norm'
+    ttf_parts.append((ttf_str[start:], 'norm'))
+    return tuple(ttf_parts)
 
 
 def divide_ttf_str(ttf_str: str,
                    sq_check: str,
                    sq_from: str,
-                   sq_to: str) -> pd.DataFrame:
+                   sq_to: str):
     """divides a ttf str into parts
     to be printed normally or marked as
-    sq_check, sq_from, sq_to"""
-    # my_dict = {'ttf_str' : ttf_str,
-    #            'sq_check' : sq_check,
-    #            'sq_from' : sq_from,
-    #            'sq_to' : sq_to}
-    pos2mark_dict = {}
-    if sq_check != '':
-        pos2mark_dict[get_linear_pos(sq_check)] = 'sq_check'
-    if sq_from != '':
-        pos2mark_dict[get_linear_pos(sq_from)] = 'sq_from'
-    if sq_to != '':
-        pos2mark_dict[get_linear_pos(sq_to)] = 'sq_to'
-
-    ttf_str_df = pd.DataFrame()
-    ttf_str_dict = {}
-    ttf_str_dict = {'type' : 'norm'} # ttf starts allways 'norm'
-    ttf_part = ''
-    for index, ttf_char in enumerate(ttf_str):
-        if index in pos2mark_dict.keys():
-            # close the old str
-            ttf_str_dict['part'] = ttf_part
-            if ttf_str_dict['part'] != '':
-                ttf_str_df = ttf_str_df.append(ttf_str_dict, ignore_index=True)
-            # put the new char - only one char
-            ttf_part = ttf_char
-            ttf_str_dict['part'] = ttf_part
-            ttf_str_dict['type'] = pos2mark_dict[index]
-            ttf_str_df = ttf_str_df.append(ttf_str_dict, ignore_index=True)
-            ttf_str_dict = {}
-            ttf_part = ''
-            ttf_str_dict = {'type' : 'norm'}
+    sq_check, sq_from, sq_to;
+    the parts of split_ttf_str() as DataFrame"""
+    import pandas as pd  # pylint: disable=import-outside-toplevel
+    return pd.DataFrame([{'type': part_type, 'part': ttf_part} for ttf_part, part_type
+                         in split_ttf_str(ttf_str, sq_check, sq_from, sq_to)],
+                        columns=['type', 'part'])
+
+
+# default max. number of diagrams at the diagram cache, off by default:
+# a lookup costs about a quarter of encoding the diagram, so the cache
+# pays off from a hit rate of about 27%, more than most collections give
+DIAGRAM_CACHE_SIZE = 0
+
+# version of the stored diagram cache, to be increased
+# with each change of the TTF mapping, the diagram segmentation or the keys
+DIAGRAM_CACHE_VERSION = 2
+
+
+class DiagramCache:
+    """A bounded LRU cache of segmented diagrams, i.e. tuples of (part, type)
+    as given by split_ttf_str(), keyed by
+    (position snapshot as bytes, sq_from, sq_to, sq_check, font, orientation);
+    it counts its hits and misses"""
+
+    def __init__(self, maxsize=DIAGRAM_CACHE_SIZE):
+        self.maxsize = maxsize
+        self.diagrams = collections.OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self.diagrams)
+
+    def get(self, key: tuple):
+        """Return the diagram cached for key, None if not cached"""
+        diagram = self.diagrams.get(key)
+        if diagram is None:
+            self.misses += 1
         else:
-            ttf_part += ttf_char
-    ttf_str_dict['part'] = ttf_part
-    ttf_str_df = ttf_str_df.append(ttf_str_dict, ignore_index=True)
-    return ttf_str_df
+            self.hits += 1
+            self.diagrams.move_to_end(key)
+        return diagram
+
+    def put(self, key: tuple, diagram: tuple):
+        """Cache the diagram for key, the least recently used beyond maxsize are dropped"""
+        if self.maxsize <= 0:
+            return
+        self.diagrams[key] = diagram
+        self.diagrams.move_to_end(key)
+        while len(self.diagrams) > self.maxsize:
+            self.diagrams.popitem(last=False)
+
+    def resize(self, maxsize: int):
+        """Set the cache's maxsize, the least recently used beyond it are dropped"""
+        self.maxsize = maxsize
+        while len(self.diagrams) > max(0, maxsize):
+            self.diagrams.popitem(last=False)
+
+    def stats(self) -> str:
+        """Return the cache's hits and misses as text"""
+        lookups = self.hits + self.misses
+        rate = self.hits / lookups if lookups else 0.0
+        return f'diagram cache: {self.hits} hits, {self.misses} misses ' + \
+            f'({rate:.0%} hit rate), {len(self)} of max. {self.maxsize} diagrams'
+
+    def store(self, file_name: str) -> bool:
+        """Return True after the cached diagrams are stored at file_name,
+        False if the file can not be written"""
+        try:
+            with open(file_name + '.tmp', 'wb') as cache_file:
+                pickle.dump((DIAGRAM_CACHE_VERSION, list(self.diagrams.items())),
+                            cache_file, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(file_name + '.tmp', file_name)
+        except OSError:
+            return False
+        return True
+
+    def load(self, file_name: str) -> bool:
+        """Return True after the diagrams stored at file_name are cached,
+        False if there is no such file or it is outdated"""
+        if not os.path.isfile(file_name):
+            return False
+        try:
+            with open(file_name, 'rb') as cache_file:
+                version, items = pickle.load(cache_file)
+        except (OSError, EOFError, ValueError, pickle.UnpicklingError, AttributeError):
+            return False
+        if version != DIAGRAM_CACHE_VERSION:
+            return False
+        for key, diagram in items:
+            self.put(key, diagram)
+        return True
+
+
+# the diagram cache of this process
+DIAGRAM_CACHE = DiagramCache()
+
 
 def main():
     """some test for the chessboard.py"""
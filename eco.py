@@ -2,12 +2,15 @@
 """functions for the eco mgmt of chess games"""
 
 import io
-import sys
 import os
 import os.path
+import pickle
+import tempfile
 
 import chess.pgn
-import pandas as pd
+import chess.polyglot
+
+import chessboard as cb
 
 
 # #####################################
@@ -46,56 +49,364 @@ ECO_TEST_DATA_DICT = {
 #####################################
 
 NEW_ECO_FILENAME = os.path.dirname(os.path.realpath(__file__))+'/eco.csv'
-if not os.path.isfile(NEW_ECO_FILENAME):
-    print(f'file \'{NEW_ECO_FILENAME}\' does not exits')
-    sys.exit(1)
 
-NEW_ECO_DF = pd.read_csv(NEW_ECO_FILENAME,
-                         sep=',',
-                         header=0,
-                         usecols=["eco", "title", "pgn",
-                                  "last_ply",
-                                  "sq_from", "sq_to", "sq_check",
-                                  "fen"])
+ECO_DIR = os.path.dirname(os.path.realpath(__file__))+'/ECO'
+
+# the ECO databases to choose from, by name
+ECO_DB_DICT = {
+    'default': NEW_ECO_FILENAME,
+    'en_2k': ECO_DIR + '/eco_en_2k_with_fen.csv',
+    'en_10k': ECO_DIR + '/eco_en_10k_with_fen.csv',
+    'de_10k': ECO_DIR + '/eco_de_10k_with_fen.csv'
+}
+
+NEW_ECO_COLUMNS = ["eco", "title", "pgn",
+                   "last_ply",
+                   "sq_from", "sq_to", "sq_check",
+                   "fen"]
+
+# the compiled ECO data of 'eco.csv' is cached at 'eco.csv.snapshot'
+ECO_SNAPSHOT_EXT = '.snapshot'
+
+# to be increased whenever the content of the snapshot changes
+ECO_SNAPSHOT_VERSION = 3
+
+
+class EcoDataError(Exception):
+    """The ECO data can not be loaded, e.g. as its csv file is missing"""
+
+
+class EcoTrie:
+    """The ECO move-sequence trie, kept flat for a quick snapshot load:
+    its edges as dict{(<node>, <move>): <child node>}, the moves as SAN strings
+    or as move keys, see move_key(), and per node the row of the opening
+    that ends there, if any; the root is node 0"""
+    __slots__ = ('edges', 'rows')
+
+    def __init__(self):
+        self.edges = {}
+        self.rows = [None]
+
+    def add(self, node: int, move) -> int:
+        """Return the child node of the node by the move, added if new"""
+        child = self.edges.get((node, move))
+        if child is None:
+            child = self.edges[node, move] = len(self.rows)
+            self.rows.append(None)
+        return child
+
+
+def move_key(move: chess.Move) -> int:
+    """Return the chess.Move as int, the key of the trie by moves"""
+    return move.from_square | move.to_square << 6 | (move.promotion or 0) << 12
+
+
+class EcoData:
+    """The compiled ECO data of one csv file: the records, i.e. one dict
+    per opening incl. its diagram as 'ttf' string in Chess Merida, the move-sequence trie
+    by SAN moves and by chess.Move, and the position index"""
+    __slots__ = ('records', 'trie', 'move_trie', 'positions')
+
+    def __init__(self, records: list, trie: EcoTrie, move_trie: EcoTrie,
+                 positions: dict):
+        self.records = records
+        self.trie = trie
+        self.move_trie = move_trie
+        self.positions = positions
+
+
+def pgn2sans(pgn: str) -> list:
+    """Return the SAN moves of a normalized pgn string, e.g.
+    '1. e4 e5 2. Nf3' --> ['e4', 'e5', 'Nf3']"""
+    sans = []
+    for token in pgn.split():
+        if token[0].isdigit() or token == '*':
+            # move number, e.g. '12.' or '12...Nf6', or result
+            if '...' in token and not token.endswith('...'):
+                sans.append(token.split('...')[-1])
+            continue
+        sans.append(token)
+    return sans
+
+
+def build_eco_trie(eco_df) -> EcoTrie:
+    """Return the move-sequence trie of the openings at eco_df"""
+    trie = EcoTrie()
+    for row, pgn in enumerate(eco_df['pgn']):
+        node = 0
+        for san in pgn2sans(pgn):
+            node = trie.add(node, san)
+        trie.rows[node] = row
+    return trie
+
+
+def build_eco_move_trie(eco_df) -> EcoTrie:
+    """Return the move-sequence trie of the openings at eco_df, keyed by move_key(),
+    to walk parsed games without generating their SAN"""
+    trie = EcoTrie()
+    for row, pgn in enumerate(eco_df['pgn']):
+        board = chess.Board()
+        node = 0
+        for san in pgn2sans(pgn):
+            move = board.parse_san(san)
+            node = trie.add(node, move_key(move))
+            board.push(move)
+        trie.rows[node] = row
+    return trie
+
+
+def build_eco_position_index(eco_df) -> dict:
+    """Return the position index of the openings at eco_df:
+    dict{<zobrist hash of the opening's fen>: (<row>, ...)}, rows in file order"""
+    position_index = {}
+    for row, fen in enumerate(eco_df['fen']):
+        key = chess.polyglot.zobrist_hash(chess.Board(fen))
+        position_index[key] = position_index.get(key, ()) + (row,)
+    return position_index
+
+
+def read_eco_csv(file_name=NEW_ECO_FILENAME):
+    """Return the ECO DataFrame of the csv file_name"""
+    # pandas is only needed to compile the snapshot, not to load it
+    import pandas as pd  # pylint: disable=import-outside-toplevel
+    if not os.path.isfile(file_name):
+        raise EcoDataError(f'file \'{file_name}\' does not exist')
+    return pd.read_csv(file_name,
+                       sep=',',
+                       header=0,
+                       usecols=NEW_ECO_COLUMNS)
+
+
+def compile_eco_data(eco_df) -> EcoData:
+    """Return the compiled ECO data of the ECO DataFrame eco_df"""
+    records = eco_df.to_dict('records')
+    for record in records:
+        record['ttf'] = cb.bitboards2ttf(chess.Board(record['fen']))
+    return EcoData(records,
+                   build_eco_trie(eco_df),
+                   build_eco_move_trie(eco_df),
+                   build_eco_position_index(eco_df))
+
+
+def get_snapshot_filename(file_name: str) -> str:
+    """Return the file name of the snapshot for the ECO csv file_name"""
+    return file_name + ECO_SNAPSHOT_EXT
+
+
+def _source_stamp(file_name: str) -> tuple:
+    """Return the stamp of the ECO csv file_name, its snapshot is valid for"""
+    stat = os.stat(file_name)
+    return (ECO_SNAPSHOT_VERSION, stat.st_size, stat.st_mtime_ns)
+
+
+def write_eco_snapshot(file_name: str, eco_data: EcoData) -> bool:
+    """Return True after the eco_data is stored as snapshot of the csv file_name,
+    False if the snapshot can not be written, e.g. at a read-only directory"""
+    snapshot_name = get_snapshot_filename(file_name)
+    # a temporary file of its own, as other processes may write the snapshot, too
+    try:
+        tmp_fd, tmp_name = tempfile.mkstemp(dir=os.path.dirname(snapshot_name) or '.',
+                                            prefix=os.path.basename(snapshot_name),
+                                            suffix='.tmp')
+    except OSError:
+        return False
+    try:
+        with os.fdopen(tmp_fd, 'wb') as snapshot_file:
+            pickle.dump((_source_stamp(file_name),
+                         eco_data.records, eco_data.trie, eco_data.move_trie,
+                         eco_data.positions),
+                        snapshot_file, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_name, snapshot_name)
+    except OSError:
+        return False
+    finally:
+        # left over only if not replaced
+        if os.path.exists(tmp_name):
+            os.remove(tmp_name)
+    return True
+
 
+def read_eco_snapshot(file_name: str):
+    """Return the compiled ECO data from the snapshot of the csv file_name,
+    None if there is no snapshot or it is outdated"""
+    snapshot_name = get_snapshot_filename(file_name)
+    if not os.path.isfile(snapshot_name):
+        return None
+    try:
+        with open(snapshot_name, 'rb') as snapshot_file:
+            stamp, records, trie, move_trie, positions = pickle.load(snapshot_file)
+    except (OSError, EOFError, ValueError, pickle.UnpicklingError, AttributeError):
+        return None
+    if stamp != _source_stamp(file_name):
+        return None
+    return EcoData(records, trie, move_trie, positions)
 
-def new_get_eco_data_for(eco=None, pgn=None) -> dict:
-    """Return the ECO data for the given ECO and PGN, even if ECO is wrong or missing"""
+
+def load_eco_data(file_name=NEW_ECO_FILENAME, rebuild=False) -> EcoData:
+    """Return the compiled ECO data of the csv file_name, read from its snapshot;
+    the snapshot is (re)built if missing, outdated or rebuild is requested"""
+    if not os.path.isfile(file_name):
+        raise EcoDataError(f'file \'{file_name}\' does not exist')
+    eco_data = None if rebuild else read_eco_snapshot(file_name)
+    if eco_data is None:
+        eco_data = compile_eco_data(read_eco_csv(file_name))
+        write_eco_snapshot(file_name, eco_data)
+    return eco_data
+
+
+def get_eco_db_filename(eco_db='default') -> str:
+    """Return the csv file name of the ECO database eco_db,
+    a name of ECO_DB_DICT or the file name of an ECO csv file"""
+    if eco_db in ECO_DB_DICT:
+        return ECO_DB_DICT[eco_db]
+    if eco_db.endswith('.csv'):
+        return eco_db
+    raise EcoDataError(f'unknown ECO database \'{eco_db}\', '
+                       f'choose one of {", ".join(ECO_DB_DICT)} or a csv file')
+
+
+# the ECO data per csv file name, each loaded on first use;
+# each worker process loads its own, see pgn.init_worker()
+_ECO_DATA_DICT = {}
+
+
+def get_eco_data(eco_db='default') -> EcoData:
+    """Return the compiled ECO data of the ECO database eco_db, loaded at the first call"""
+    file_name = get_eco_db_filename(eco_db)
+    if file_name not in _ECO_DATA_DICT:
+        _ECO_DATA_DICT[file_name] = load_eco_data(file_name)
+    return _ECO_DATA_DICT[file_name]
+
+
+def _walk_trie(trie: EcoTrie, moves) -> list:
+    """Return the rows of the openings passed by one walk along the moves"""
+    found_rows = []
+    edges = trie.edges
+    rows = trie.rows
+    node = 0
+    for move in moves:
+        node = edges.get((node, move))
+        if node is None:
+            break
+        if rows[node] is not None:
+            found_rows.append(rows[node])
+    return found_rows
+
+
+def get_eco_data_for_sans(sans: list, eco='', eco_db='default') -> dict:
+    """Return the ECO data for the game's SAN moves, i.e. the opening
+    with the longest move sequence the game starts with, preferably
+    one of the given ECO code; empty if there is no such opening"""
+    eco_data = get_eco_data(eco_db)
+    records = eco_data.records
+    # one walk along the game's moves, collecting the openings passed
+    found_rows = _walk_trie(eco_data.trie, sans)
+    return _select_found_row(records, found_rows, eco)
+
+
+def _select_found_row(records: list, found_rows: list, eco: str) -> dict:
+    """Return the ECO data of the longest opening of the found_rows,
+    preferably one of the given ECO code; empty if none is found"""
+    # do we have an ECO code
+    if eco:
+        for row in reversed(found_rows):
+            if records[row]['eco'] == eco:
+                return dict(records[row])
+
+    # if no ECO available or given ECO is wrong
+    # and no related ECO data found
+    # take the longest opening of the complete database
+    if found_rows:
+        return dict(records[found_rows[-1]])
+    return {}
+
+
+def get_eco_data_for_games(games, ecos=None, eco_db='default') -> list:
+    """Return the ECO data for each of the games, as get_eco_data_for_sans(),
+    in one pass; the games are chess.pgn.Game, whose ECO tag is used,
+    or lists of moves, as SAN strings or as chess.Move from the standard
+    start position, with their ECO codes, if any, at ecos.
+    The parsed moves are walked along the trie by chess.Move,
+    i.e. without generating their SAN."""
+    eco_data = get_eco_data(eco_db)
+    records = eco_data.records
+    results = []
+    for number, game in enumerate(games):
+        if isinstance(game, (list, tuple)):
+            eco = ''
+            if game and isinstance(game[0], str):
+                found_rows = _walk_trie(eco_data.trie, game)
+            else:
+                found_rows = _walk_trie(eco_data.move_trie, map(move_key, game))
+        else:
+            eco = game.headers.get('ECO', '')
+            if 'FEN' in game.headers:
+                # a game from a set-up position passes no opening
+                found_rows = []
+            else:
+                found_rows = _walk_trie(eco_data.move_trie,
+                                        map(move_key, game.mainline_moves()))
+        if ecos is not None:
+            eco = ecos[number] or ''
+        results.append(_select_found_row(records, found_rows, eco))
+    return results
+
+
+def get_eco_data_for_hashes(hashes, eco='', eco_db='default') -> dict:
+    """Return the ECO data for the game's zobrist position hashes, one per ply:
+    the opening of the last book position the game passes through,
+    in any move order, preferably one of the given ECO code;
+    empty if the game passes no book position"""
+    eco_data = get_eco_data(eco_db)
+    records = eco_data.records
+    position_index = eco_data.positions
+    found_rows = []
+    for key in hashes:
+        rows = position_index.get(key)
+        if rows is not None:
+            found_rows.append(rows)
+
+    # do we have an ECO code
+    if eco:
+        for rows in reversed(found_rows):
+            for row in rows:
+                if records[row]['eco'] == eco:
+                    return dict(records[row])
+
+    if found_rows:
+        return dict(records[found_rows[-1][0]])
+    return {}
+
+
+def iter_position_hashes(sans: list):
+    """Yield the zobrist hash of the position after each of the SAN moves"""
+    board = chess.Board()
+    for san in sans:
+        board.push_san(san)
+        yield chess.polyglot.zobrist_hash(board)
+
+
+def get_eco_data_by_position(sans: list, eco='', eco_db='default') -> dict:
+    """Return the ECO data for the game's SAN moves, by the positions
+    the game passes through, i.e. transpositions are found, too"""
+    return get_eco_data_for_hashes(iter_position_hashes(sans), eco, eco_db)
+
+
+def new_get_eco_data_for(eco=None, pgn=None, by_position=False, eco_db='default') -> dict:
+    """Return the ECO data for the given ECO and PGN, even if ECO is wrong or missing,
+    out of the ECO database eco_db;
+    by_position finds the opening reached by a different move order, too"""
     if eco is None:
         eco = ''
     if pgn is None:
-        sys.exit("error: no pgn given at 'get_eco_data_for()'")
+        raise ValueError("no pgn given at 'new_get_eco_data_for()'")
 
     # normalize the pgn string
     pgn = normalize_pgn_string(pgn)
 
-    found_eco_dict = {}
-    # do we have an ECO code
-    if eco != '':
-        # get all entries from pgn.eco_df
-        # that fits to given eco_code
-        filtered_eco_data_df = NEW_ECO_DF[eco == NEW_ECO_DF['eco']]  # .copy()
-        rev_sorted_eco_data_df = filtered_eco_data_df.sort_values(
-            'pgn', ascending=False)  # .copy()
-        for _, row in rev_sorted_eco_data_df.iterrows():
-            #print('len:', len(row['pgn']), '[',row['pgn'], '] last char:', row['pgn'][-1])
-            if row['pgn'] == pgn[:len(row['pgn'])]:
-                found_eco_dict = row.to_dict()
-                break
-
-    # if no ECO available or given ECO is wrong
-    # and no related ECO data found
-    # do it again and check with complete database
-    if not bool(found_eco_dict):
-        eco_data_df = NEW_ECO_DF  # .copy()
-        rev_sorted_eco_data_df = eco_data_df.sort_values(
-            'pgn', ascending=False)  # .copy()
-        for _, row in rev_sorted_eco_data_df.iterrows():
-            #print('len:', len(row['pgn']), '[',row['pgn'], '] last char:', row['pgn'][-1])
-            if row['pgn'] == pgn[:len(row['pgn'])]:
-                found_eco_dict = row.to_dict()
-                break
-    return found_eco_dict
+    if by_position:
+        return get_eco_data_by_position(pgn2sans(pgn), eco, eco_db)
+    return get_eco_data_for_sans(pgn2sans(pgn), eco, eco_db)
 
 
 def normalize_pgn_string(pgn: str) -> str:
@@ -0,0 +1,57 @@
+"""functions for the manifest of rendered games at the docx directory,
+to skip games already rendered at a re-run"""
+
+import hashlib
+import json
+import os.path
+
+# the manifest file at the docx directory;
+# one line per rendered game: '<game key>\t<docx file name>'
+MANIFEST_NAME = '.pgn2docx_manifest'
+
+
+def get_manifest_filename(docx_dir: str) -> str:
+    """Return the file name of the manifest at the docx_dir"""
+    return os.path.join(docx_dir, MANIFEST_NAME)
+
+
+def game_key(game, settings: dict) -> str:
+    """Return a stable hash of the pgn.GameRecord's headers and movetext,
+    and the render settings, e.g. font, layout and code version"""
+    headers = {key: str(value) for key, value in game.headers.items()}
+    content = json.dumps([headers, game.pgn, settings],
+                         sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(content.encode('utf-8')).hexdigest()
+
+
+def load_manifest(docx_dir: str) -> dict:
+    """Return the manifest of the docx_dir as dict{<game key>: <docx file name>},
+    empty if there is no manifest yet"""
+    manifest_dict = {}
+    file_name = get_manifest_filename(docx_dir)
+    if not os.path.isfile(file_name):
+        return manifest_dict
+    with open(file_name, 'r', encoding='utf-8') as manifest_file:
+        for line in manifest_file:
+            key, sep, docx_fn = line.rstrip('\n').partition('\t')
+            # ignore a line cut off, e.g. by an interrupted run
+            if sep and docx_fn:
+                manifest_dict[key] = docx_fn
+    return manifest_dict
+
+
+def is_rendered(manifest_dict: dict, key: str) -> bool:
+    """Return whether the game with key is rendered and its docx file still exists"""
+    return key in manifest_dict and os.path.isfile(manifest_dict[key])
+
+
+def open_manifest(docx_dir: str):
+    """Return the manifest of the docx_dir opened for appending entries"""
+    return open(get_manifest_filename(docx_dir), 'a', encoding='utf-8')
+
+
+def append_entry(manifest_file, key: str, docx_fn: str):
+    """Append the rendered game's key and its docx file name to the open manifest_file"""
+    manifest_file.write(f'{key}\t{docx_fn}\n')
+    # each entry is on disk as soon as its docx file is
+    manifest_file.flush()
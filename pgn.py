@@ -4,7 +4,10 @@
 # pylint: disable=too-many-statements
 """functions for pgn mgmt, and docx generation"""
 
+import functools
+import gc
 import io
+import multiprocessing
 import os
 import os.path
 import re
@@ -12,6 +15,7 @@ import re
 
 
 import warnings
+from concurrent.futures import ProcessPoolExecutor
 
 import chess
 import chess.pgn
@@ -24,137 +28,503 @@ from docx.oxml import OxmlElement, ns
 from docx.shared import Inches, Mm, Pt, RGBColor
 from docx.oxml.ns import qn
 
+import analysis
 import chessboard as cb
 import eco
+import pgnindex
 
 warnings.simplefilter(action='ignore', category=FutureWarning)
 
+# version of the generated documents, to be increased
+# with each change of the docx layout or its content
+RENDER_VERSION = '0.1'
+
+# the start method of the worker processes: where available, they are forked
+# from a server process that has just imported this module, not from this
+# process, which may run other threads at that time (see pipeline)
+if 'forkserver' in multiprocessing.get_all_start_methods():
+    WORKER_CONTEXT = multiprocessing.get_context('forkserver')
+    WORKER_CONTEXT.set_forkserver_preload(['pgn'])
+else:
+    WORKER_CONTEXT = multiprocessing.get_context('spawn')
+
+# the orientations of the diagrams: from White view, from Black view,
+# or each from the view of the side to move in its position
+ORIENTATIONS = ('white', 'black', 'turn')
+
 
 def get_pgnfile_names_from_dir(pgn_dir='PGN/', ext='.pgn') -> list:
     """Return a python list with filenames
-       from a given directory and given extension '.pgn' '.PGN'"""
+       from a given directory and given extension '.pgn' '.PGN',
+       incl. the compressed files '.pgn.gz', '.pgn.bz2', '.pgn.xz'"""
+    exts = tuple(ext.lower() + comp_ext for comp_ext in
+                 [''] + list(pgnindex.COMPRESSION_DICT.keys()))
     file_names_list = []
     for file in os.listdir(pgn_dir):
-        if file.endswith(ext) or file.endswith(ext.upper()):
+        if file.lower().endswith(exts):
             if os.path.isfile(os.path.join(pgn_dir, file)):
                 file_names_list.append(os.path.join(pgn_dir, file))
     return sorted(file_names_list)
 
 
+def open_pgnfile(file_name: str):
+    """Return the pgn file_name opened for reading as text with a large buffer,
+    transparently decompressed for '.gz', '.bz2' and '.xz' files,
+    decoded as pgnindex.PGN_ENCODING"""
+    return io.TextIOWrapper(pgnindex.open_pgn_binary(file_name),
+                            encoding=pgnindex.PGN_ENCODING, errors=pgnindex.PGN_ERRORS)
+
+
+def _date_in_range(date: str, date_from: str, date_to: str) -> bool:
+    """Return whether the pgn date 'YYYY.MM.DD' is within [date_from, date_to];
+    unknown parts of the date, e.g. '1879.??.??', match any day of that year"""
+    date = date.replace('-', '.')
+    known = date.split('?')[0]
+    if date_from and known < date_from.replace('-', '.')[:len(known)]:
+        return False
+    if date_to and known > date_to.replace('-', '.')[:len(known)]:
+        return False
+    return True
+
+
+def match_headers(headers, player=None, event=None,
+                  date_from=None, date_to=None,
+                  eco_from=None, eco_to=None,
+                  result=None) -> bool:
+    """Return True if the game's headers match all given criteria:
+    player and event case insensitive as part of the tag's value,
+    date and ECO as inclusive ranges, result as exact value"""
+    if player is not None:
+        if not any(player.lower() in headers.get(tag, '').lower()
+                   for tag in ('White', 'Black')):
+            return False
+    if event is not None:
+        if event.lower() not in headers.get('Event', '').lower():
+            return False
+    if date_from is not None or date_to is not None:
+        if not _date_in_range(headers.get('Date', '????.??.??'), date_from, date_to):
+            return False
+    if eco_from is not None or eco_to is not None:
+        eco_code = headers.get('ECO', '')
+        if eco_code == '':
+            return False
+        if eco_from is not None and eco_code < eco_from:
+            return False
+        if eco_to is not None and eco_code > eco_to:
+            return False
+    if result is not None:
+        if headers.get('Result', '') != result:
+            return False
+    return True
+
+
+def make_header_filter(**criteria):
+    """Return a predicate on a game's headers, see match_headers() for the criteria;
+    the predicate can be passed to worker processes"""
+    return functools.partial(match_headers, **criteria)
+
+
+class MainlineVisitor(chess.pgn.BaseVisitor):
+    """A lean 'chess.pgn' visitor that keeps only the headers and the mainline moves;
+    comments, NAGs and variations are skipped without building any 'GameNode'.
+    With a header_filter, the movetext of non-matching games is skipped as well.
+    The mainline's replay is kept as analysis.GameAnalysis for all later stages."""
+
+    def __init__(self, header_filter=None):
+        self.header_filter = header_filter
+        self.headers = chess.pgn.Headers()
+        self.san_parts = []
+        self.errors = []
+        self.skipped = False
+        self.analysis = None
+        self.move_pending = False
+
+    def begin_headers(self):
+        return self.headers
+
+    def visit_header(self, tagname: str, tagvalue: str):
+        self.headers[tagname] = tagvalue
+
+    def end_headers(self):
+        if self.header_filter is not None:
+            self.skipped = not self.header_filter(self.headers)
+        return chess.pgn.SKIP if self.skipped else None
+
+    def begin_variation(self):
+        return chess.pgn.SKIP
+
+    def visit_move(self, board: chess.Board, move: chess.Move):
+        san = board.san(move)
+        # same notation as 'chess.Board.variation_san'
+        if board.turn == chess.WHITE:
+            self.san_parts.append(f'{board.fullmove_number}. {san}')
+        elif not self.san_parts:
+            self.san_parts.append(f'{board.fullmove_number}...{san}')
+        else:
+            self.san_parts.append(san)
+        self.analysis.add_move(san, move)
+        self.move_pending = True
+
+    def visit_board(self, board: chess.Board):
+        if self.analysis is None:
+            # the start position
+            self.analysis = analysis.GameAnalysis(board)
+        elif self.move_pending:
+            # the position after the last move
+            self.analysis.add_position(board)
+            self.move_pending = False
+
+    def handle_error(self, error: Exception):
+        self.errors.append(error)
+
+    def result(self):
+        return self
+
+    def pgn(self) -> str:
+        """Return the mainline as pgn game notation, e.g. '1. e4 e5 2. Nf3'"""
+        return ' '.join(self.san_parts)
+
+
+def read_mainline(pgn_file, header_filter=None):
+    """Return the MainlineVisitor of the next game at the open pgn_file,
+    None at the end of the file"""
+    return chess.pgn.read_game(pgn_file,
+                               Visitor=lambda: MainlineVisitor(header_filter))
+
+
+class GameRecord:
+    """One game as read from a pgn file: just the headers given for it,
+    its mainline as pgn game notation and as analysis.GameAnalysis,
+    and its source, i.e. the file name and the byte offset, if known"""
+    __slots__ = ('headers', 'pgn', 'analysis', 'file', 'offset')
+
+    def __init__(self, headers: dict, pgn_str: str, game_analysis=None,
+                 file_name='', offset=None):
+        self.headers = headers
+        self.pgn = pgn_str
+        self.analysis = game_analysis
+        self.file = file_name
+        self.offset = offset
+
+    def __eq__(self, other) -> bool:
+        if not isinstance(other, GameRecord):
+            return NotImplemented
+        return all(getattr(self, slot) == getattr(other, slot) for slot in self.__slots__)
+
+    def __repr__(self) -> str:
+        return f'GameRecord({self.headers!r}, {self.pgn!r}, file={self.file!r})'
+
+    def to_dict(self) -> dict:
+        """Return the game as flat dict of its headers, 'pgn' and 'file'"""
+        return dict(self.headers, pgn=self.pgn, file=self.file)
+
+
+def iter_games_from_handle(pgn_file, file_name: str, header_filter=None):
+    """Yield one GameRecord per game read from the open pgn_file,
+    if given, only for the games whose headers pass the header_filter"""
+    # iterate over all games of a file
+    while True:
+        mainline = None
+        try:
+            mainline = read_mainline(pgn_file, header_filter)
+            if mainline is None:
+                break
+        except BaseException as err:
+            print(f"Unexpected {err=}, {type(err)=}")
+            print('at file:', file_name, 'with')
+            print(mainline)
+            continue
+        if mainline.skipped:
+            continue
+
+        game = GameRecord(dict(mainline.headers), mainline.pgn(),
+                          mainline.analysis, file_name)
+        # the game is kept up to its first parse error, e.g. an illegal SAN
+        for err in mainline.errors:
+            print(f"Unexpected {err=}, {type(err)=}")
+            print('at file:', file_name, 'with')
+            print(game)
+        yield game
+
+
+def iter_games_from_pgnfile(file_name: str, header_filter=None, jobs=1):
+    """Yield one GameRecord per game of the file_name, incl. headers and pgn game notation,
+    as soon as the game is parsed - the file is never held in memory as a whole.
+    With a header_filter, see make_header_filter(), only the matching games are
+    parsed beyond their headers. With jobs > 1 the file is parsed in chunks
+    at a pool of worker processes, see iter_games_parallel(), but
+    compressed files, see open_pgnfile(), are always parsed sequentially."""
+    if jobs > 1 and not pgnindex.is_compressed(file_name):
+        yield from iter_games_parallel(file_name, jobs, header_filter)
+        return
+    with open_pgnfile(file_name) as pgn_file:
+        yield from iter_games_from_handle(pgn_file, file_name, header_filter)
+
+
+def get_games_from_range(file_name: str, start: int, end: int, header_filter=None) -> list:
+    """Return the GameRecords of the games within the byte range [start, end)
+    of the file_name, the range starts at a game boundary"""
+    with pgnindex.open_pgn_bytes(file_name) as pgn_bytes:
+        game_text = pgnindex.read_game_text(pgn_bytes, start, end - start)
+    return list(iter_games_from_handle(game_text, file_name, header_filter))
+
+
+# target size of one chunk of a pgn file, parsed by one worker process;
+# its parsed games are held in memory until yielded
+PARSE_CHUNK_SIZE = 1024 * 1024
+
+
+def iter_games_parallel(file_name: str, jobs: int, header_filter=None):
+    """Yield the GameRecords of the file_name, just the same and in the same order
+    as a sequential parse, but parsed in chunks at jobs worker processes;
+    the chunks are byte ranges aligned on game boundaries"""
+    if os.path.getsize(file_name) == 0:
+        return
+    parts = max(jobs, -(-os.path.getsize(file_name) // PARSE_CHUNK_SIZE))
+    ranges = pgnindex.split_pgnfile(file_name, parts)
+    with ProcessPoolExecutor(max_workers=jobs, mp_context=WORKER_CONTEXT) as executor:
+        # a bounded window of pending chunks, handed out in file order:
+        # one chunk per worker, plus the one being yielded
+        pending = []
+        for start, end in ranges:
+            pending.append(executor.submit(get_games_from_range,
+                                           file_name, start, end, header_filter))
+            if len(pending) > jobs:
+                yield from pending.pop(0).result()
+        for future in pending:
+            yield from future.result()
+
+
+def iter_games_from_index(file_name: str, start=0, stop=None, header_filter=None):
+    """Yield the GameRecords of the games number start ... stop-1 of the file_name,
+    each read directly at its byte offset, as given by the file's sidecar index.
+    A header_filter is checked against the index' key headers first,
+    so non-matching games are not read at all; without, only the
+    offsets of the games are read from the memory-mapped index."""
+    if header_filter is None:
+        offsets = pgnindex.load_offsets(file_name)[start:stop]
+    else:
+        index_df = pgnindex.load_index(file_name).iloc[start:stop]
+        matching = [header_filter(row) for row in
+                    index_df[pgnindex.INDEX_HEADERS].to_dict('records')]
+        offsets = index_df.loc[matching, ['offset', 'length']].to_numpy()
+    if len(offsets) == 0:
+        return
+    with pgnindex.open_pgn_bytes(file_name) as pgn_bytes:
+        for offset, length in offsets:
+            game_text = pgnindex.read_game_text(pgn_bytes, int(offset), int(length))
+            for game in iter_games_from_handle(game_text, file_name):
+                game.offset = int(offset)
+                yield game
+
+
+def get_game_from_pgnfile(file_name: str, number: int) -> GameRecord:
+    """Return the GameRecord of game number (0 based) of the file_name,
+    without parsing the games before it"""
+    for game in iter_games_from_index(file_name, number, number + 1):
+        return game
+    raise IndexError(f'no game {number} at file: {file_name}')
+
+
+def collect(games) -> pd.DataFrame:
+    """Return a DataFrame with all GameRecords of the given iterable,
+    e.g. from iter_games_from_pgnfile(), built in one go;
+    tags missing at a game are '' at its row"""
+    return pd.DataFrame([game.to_dict() for game in games]).fillna('')
+
+
 def get_games_from_pgnfile(file_name: str) -> pd.DataFrame:
     """Return a DataFrame with all games of the file_name, incl. headers and pgn game notation."""
-    with open(file_name, "r", encoding='utf-8') as pgn_file:
-        games_df = pd.DataFrame()
-        # iterate over all games of a file
-        while True:
-            try:
-                game = chess.pgn.read_game(pgn_file)
-                if game is None:
-                    break
-            except BaseException as err:
-                print(f"Unexpected {err=}, {type(err)=}")
-                print('at file:', file_name, 'with')
-                print(game)
-                continue
-
-            try:
-                game_dict = dict(game.headers)
-                game_dict["pgn"] = game.board().variation_san(
-                    game.mainline_moves())
-                game_dict['file'] = file_name
-                games_df = games_df.append(game_dict, ignore_index=True)
-            except BaseException as err:
-                print(f"Unexpected {err=}, {type(err)=}")
-                print('at file:', file_name, 'with')
-                print(game)
-                continue
-    return games_df
+    return collect(iter_games_from_pgnfile(file_name))
+
+
+class FullMove:
+    """One row of a game's move table, i.e. a full move: per side its
+    half move string, its marked squares, '' if none, its TTF diagram
+    and the diagram segmented by its marked squares"""
+    ROW_SLOTS = ('fmvn',
+                 'w_hmv_str', 'w_sq_from', 'w_sq_to', 'w_sq_check', 'w_board_ttf',
+                 'b_hmv_str', 'b_sq_from', 'b_sq_to', 'b_sq_check', 'b_board_ttf')
+    __slots__ = ROW_SLOTS + ('w_diagram', 'b_diagram')
+
+    def __init__(self, fmvn: int):
+        self.fmvn = fmvn
+        self.w_hmv_str = self.w_sq_from = self.w_sq_to = ''
+        self.w_sq_check = self.w_board_ttf = ''
+        self.b_hmv_str = self.b_sq_from = self.b_sq_to = ''
+        self.b_sq_check = self.b_board_ttf = ''
+        self.w_diagram = self.b_diagram = ()
+
+    def to_dict(self) -> dict:
+        """Return the full move as dict, with the keys of the former DataFrame rows"""
+        full_move_dict = {slot: getattr(self, slot) for slot in self.ROW_SLOTS}
+        full_move_dict['FMVN'] = full_move_dict.pop('fmvn')
+        return full_move_dict
+
+
+def get_orientations(game_analysis: analysis.GameAnalysis, orientation='white') -> list:
+    """Return the orientation, chess.WHITE or chess.BLACK, of the diagram
+    after each half move of the game, for the orientation of ORIENTATIONS"""
+    if orientation == 'turn':
+        # the side to move after the half move
+        return [not game_analysis.turn(ply) for ply in range(len(game_analysis))]
+    if orientation not in ORIENTATIONS:
+        raise ValueError(f'unknown orientation \'{orientation}\', '
+                         f'choose one of: {", ".join(ORIENTATIONS)}')
+    return [orientation == 'white'] * len(game_analysis)
+
+
+# below this number of diagrams to encode, patching each from the diagram
+# before it (about 15 us each) is faster than one batch (about 60 us + 3 us each)
+PATCH_MAX_DIAGRAMS = 6
+
+
+def patch_diagrams(game_analysis: analysis.GameAnalysis,
+                   diagrams: list,
+                   plies: list,
+                   ttf_font_name='Chess Merida',
+                   orientations=None) -> list:
+    """Return the TTF strings of the diagrams after the half moves plies,
+    each patched from the diagram before it, see cb.patch_ttf(), if that is
+    given at diagrams or one of plies and has the same orientation,
+    else encoded in full"""
+    if orientations is None:
+        orientations = [chess.WHITE] * len(game_analysis)
+    board_ttfs = {}
+    for ply in plies:
+        board = analysis.snapshot2board(game_analysis.snapshot(ply))
+        last_ttf = None
+        if ply > 0 and orientations[ply - 1] == orientations[ply]:
+            last_ttf = board_ttfs.get(ply - 1)
+            if last_ttf is None and diagrams[ply - 1] is not None:
+                last_ttf = ''.join(part for part, _ in diagrams[ply - 1]) + '\n'
+        if last_ttf is None:
+            board_ttfs[ply] = cb.bitboards2ttf(board, ttf_font_name, orientations[ply])
+        else:
+            board_ttfs[ply] = cb.patch_ttf(last_ttf,
+                                           analysis.snapshot2board(game_analysis.snapshot(ply - 1)),
+                                           board, ttf_font_name, orientations[ply])
+    return [board_ttfs[ply] for ply in plies]
+
+
+def prep_diagrams(game_analysis: analysis.GameAnalysis,
+                  marks: list,
+                  ttf_font_name='Chess Merida',
+                  diagram_cache=None,
+                  orientations=None) -> list:
+    """Return the segmented diagram after each half move of the game,
+    see cb.DiagramCache, with its (sq_from, sq_to, sq_check) marks,
+    from the view of its orientation, by default all from White view;
+    taken from the diagram cache, by default the one of this process, if on,
+    the diagrams not cached yet are encoded in one batch, or if only a few,
+    patched from the diagrams before them"""
+    if diagram_cache is None:
+        diagram_cache = cb.DIAGRAM_CACHE
+    if orientations is None:
+        orientations = [chess.WHITE] * len(game_analysis)
+    if diagram_cache.maxsize <= 0:
+        # the cache is off, no keys to build or look up
+        keys = None
+        diagrams = [None] * len(game_analysis)
+    else:
+        # keyed by the 64 bytes of each position's snapshot
+        snapshot_bytes = game_analysis.snapshots.tobytes()
+        keys = [(snapshot_bytes[64 * ply:64 * ply + 64], sq_from, sq_to, sq_check,
+                 ttf_font_name, orientation)
+                for ply, ((sq_from, sq_to, sq_check), orientation)
+                in enumerate(zip(marks, orientations))]
+        diagrams = [diagram_cache.get(key) for key in keys]
+    missing = [ply for ply, diagram in enumerate(diagrams) if diagram is None]
+    if missing:
+        if len(missing) < PATCH_MAX_DIAGRAMS:
+            board_ttfs = patch_diagrams(game_analysis, diagrams, missing, ttf_font_name,
+                                        orientations)
+        else:
+            snapshots = np.frombuffer(game_analysis.snapshots, dtype=np.uint64).reshape(-1, 8)
+            board_ttfs = cb.codes2ttf(
+                cb.snapshots2codes(snapshots[missing], [orientations[ply] for ply in missing]),
+                ttf_font_name)
+        for ply, board_ttf in zip(missing, board_ttfs):
+            sq_from, sq_to, sq_check = marks[ply]
+            # the diagram without the line end of its last line
+            diagrams[ply] = cb.split_ttf_str(board_ttf[:-1], sq_check, sq_from, sq_to,
+                                             orientations[ply])
+            if keys is not None:
+                diagram_cache.put(keys[ply], diagrams[ply])
+    return diagrams
+
+
+def prep_move_table(game_analysis: analysis.GameAnalysis,
+                    ttf_font_name='Chess Merida',
+                    diagram_cache=None,
+                    orientation='white') -> list:
+    """Return the game's move table, a list of FullMove, one per full move
+    completed by Black, out of the game's analysis, i.e. without replaying the game;
+    its diagrams in the orientation of ORIENTATIONS"""
+    marks = []
+    for ply in range(len(game_analysis)):
+        # square names are shared strings, no allocation per move
+        sq_check = game_analysis.check_squares[ply]
+        marks.append((chess.SQUARE_NAMES[game_analysis.from_squares[ply]],
+                      chess.SQUARE_NAMES[game_analysis.to_squares[ply]],
+                      '' if sq_check is None else chess.SQUARE_NAMES[sq_check]))
+    diagrams = prep_diagrams(game_analysis, marks, ttf_font_name, diagram_cache,
+                             get_orientations(game_analysis, orientation))
+    move_table = []
+    full_move = None
+    for ply, san in enumerate(game_analysis.sans):
+        fmvn = game_analysis.fullmove_number(ply)
+        if full_move is None:
+            full_move = FullMove(fmvn)
+        sq_from, sq_to, sq_check = marks[ply]
+        diagram = diagrams[ply]
+        board_ttf = ''.join(part for part, _ in diagram) + '\n'
+        if chess.WHITE == game_analysis.turn(ply):
+            full_move.w_hmv_str = f'{fmvn}. {san} ... '
+            full_move.w_sq_from = sq_from
+            full_move.w_sq_to = sq_to
+            full_move.w_sq_check = sq_check
+            full_move.w_board_ttf = board_ttf
+            full_move.w_diagram = diagram
+        else:
+            full_move.b_hmv_str = f'{fmvn}.  ... {san}'
+            full_move.b_sq_from = sq_from
+            full_move.b_sq_to = sq_to
+            full_move.b_sq_check = sq_check
+            full_move.b_board_ttf = board_ttf
+            full_move.b_diagram = diagram
+            move_table.append(full_move)
+            full_move = None
+    return move_table
 
 
 def prep_ttfboards_from_pgn(pgn_str: str) -> pd.DataFrame:
-    """Return at each row full move info: W & B SAN string and W & B TTF board string"""
-    # start chess board
-    board = chess.Board()
-    game = chess.pgn.read_game(io.StringIO(pgn_str))
-
-    # prep for half moves
-    half_moves_df = pd.DataFrame()
-    for move in game.mainline_moves():
-        # dict of half move infos
-        move_dict = {}
-
-        move = chess.Move.from_uci(move.uci())
-        move_dict['FMVN'] = int(board.fullmove_number)
-        move_dict['SAN'] = board.san(move)
-
-        # fromto for later markup
-        move_dict['sq_from'] = move.uci()[:2]
-        move_dict['sq_to'] = move.uci()[2:4]
-        # site to move chess.WHITE or chess.BLACK
-        move_dict['player'] = board.turn
-        if chess.WHITE == board.turn:
-            move_dict['mv_san_str'] = \
-                str(move_dict['FMVN']) + '. ' + \
-                move_dict['SAN'] + ' ... '
-        else:
-            move_dict['mv_san_str'] = \
-                str(move_dict['FMVN']) + '. ' + \
-                ' ... ' + move_dict['SAN']
-
-        board.push(move)
-        sq_check = ''
-        if board.is_check():
-            sq_check = chess.square_name(board.king(board.turn))
-        move_dict['sq_check'] = sq_check
-
-        move_dict['board_arr'] = cb.board2arr(board)
-        # print(move_dict)
-        half_moves_df = half_moves_df.append(move_dict, ignore_index=True)
-
-    half_moves_df = half_moves_df.astype({'FMVN': np.uint8})
-    # print(half_moves_df)
-
-    # half moves to full moves data
-    # for direct use at document creation
-    full_moves_df = pd.DataFrame()
-    full_move_dict = {}
-    for _, hmv in half_moves_df.iterrows():
-        full_move_dict['FMVN'] = int(hmv['FMVN'])
-        if chess.WHITE == hmv['player']:
-            full_move_dict['w_hmv_str'] = hmv['mv_san_str']
-            # depending on marked squares
-            # change the boards' ttf representation
-            full_move_dict['w_sq_from'] = hmv['sq_from']
-            full_move_dict['w_sq_to'] = hmv['sq_to']
-            full_move_dict['w_sq_check'] = hmv['sq_check']
-            full_move_dict['w_board_ttf'] = cb.arr2ttf(hmv['board_arr'])
-        else:
-            #full_move_dict['b_hmv_str'] = full_move_dict['w_hmv_str'][:-5] + ' ' +  hmv['SAN']
-            full_move_dict['b_hmv_str'] = hmv['mv_san_str']
-            # depending on marked squares
-            # change the boards' ttf representation
-            full_move_dict['b_sq_from'] = hmv['sq_from']
-            full_move_dict['b_sq_to'] = hmv['sq_to']
-            full_move_dict['b_sq_check'] = hmv['sq_check']
-            full_move_dict['b_board_ttf'] = cb.arr2ttf(hmv['board_arr'])
-            full_moves_df = full_moves_df.append(
-                full_move_dict, ignore_index=True)
-    full_moves_df = full_moves_df.astype({'FMVN': np.uint8})
-    return full_moves_df
-
-
-def gen_document_from_game(game_dict: dict,
-                           eco_dict: dict,
-                           ttf_font_name='Chess Merida') -> Document:
-    """Return a docx.Document Din A4 with the chess diagrams for a given game_dict"""
+    """Return at each row full move info: W & B SAN string and W & B TTF board string,
+    the move table of prep_move_table() as DataFrame"""
+    move_table = prep_move_table(analysis.analyze_pgn(pgn_str))
+    full_moves_df = pd.DataFrame([full_move.to_dict() for full_move in move_table],
+                                 columns=['FMVN'] + list(FullMove.ROW_SLOTS[1:]))
+    return full_moves_df.astype({'FMVN': np.uint8})
 
-    # if ttf_font_name not in cb.TTF_dict.keys():
-    #     print(f'You choose TTF {ttf_font_name},
-    #     which is not is my list of fonts to chose from:')
-    #     for font in cb.TTF_dict.keys():
-    #         print(f'  - {font] with {cb.TTF_dict[font]}')
-    #     print('Please install the font you want.')
-    #     print('I will continue docx generation with TTF Chess Merida')
+
+def gen_document_from_game(game: GameRecord,
+                           eco_dict: dict,
+                           ttf_font_name='Chess Merida',
+                           orientation='white') -> Document:
+    """Return a docx.Document Din A4 with the chess diagrams for a given game,
+    the ttf_font_name has to be registered, see chessboard.register_font(),
+    the diagrams are in the orientation of ORIENTATIONS"""
+
+    # fail before any diagram, if the font is not registered
+    cb.get_font(ttf_font_name)
+
+    # the PGN data for diagram genration, fails for an unknown orientation
+    if game.analysis is not None:
+        move_table = prep_move_table(game.analysis, ttf_font_name,
+                                     orientation=orientation)
+    else:
+        move_table = prep_move_table(analysis.analyze_pgn(game.pgn), ttf_font_name,
+                                     orientation=orientation)
 
     doc = Document()
 
@@ -182,10 +552,11 @@ def gen_document_from_game(game_dict: dict,
     header = doc.sections[0].header
     #header.bottom_margin = Inches(0.2)
     head = header.paragraphs[0]
-    head.text = f"{game_dict['Date'].replace('.','-')} " + \
-        f"{game_dict['Event']}, {game_dict['Site']}\n" + \
-        f"{game_dict['White']} vs. {game_dict['Black']}   " + \
-        f"{game_dict['Result']}"
+    headers = game.headers
+    head.text = f"{headers['Date'].replace('.','-')} " + \
+        f"{headers['Event']}, {headers['Site']}\n" + \
+        f"{headers['White']} vs. {headers['Black']}   " + \
+        f"{headers['Result']}"
     # doc header --------------------------------------
 
     # doc footer --------------------------------------
@@ -245,14 +616,12 @@ def gen_document_from_game(game_dict: dict,
 
     # first page of the booklet
     out_str = ''
-    for key in game_dict.keys():
-        # if (key != 'file' and key != 'pgn'):
-        if key not in ('file', 'pgn'):
-            out_str = out_str + \
-                '[{k}] \"{v}\"\n'.format(k=key, v=game_dict[key])
+    for key, value in headers.items():
+        out_str = out_str + \
+            '[{k}] \"{v}\"\n'.format(k=key, v=value)
 
     out_str = out_str + '\n'
-    out_str = out_str + f"{game_dict['pgn']}  {game_dict['Result']}\n"
+    out_str = out_str + f"{game.pgn}  {headers['Result']}\n"
     doc.add_paragraph(out_str)
 
     # some words about the game's ECO
@@ -270,10 +639,19 @@ def gen_document_from_game(game_dict: dict,
 
             doc.add_paragraph(eco_txt)
 
-            eco_board = chess.Board(eco_dict['fen'])
+            # the ECO data comes with its diagram precomputed,
+            # in Chess Merida's glyphs from White view
+            if 'ttf' in eco_dict.keys() and ttf_font_name == 'Chess Merida' \
+                    and orientation == 'white':
+                eco_ttf = eco_dict['ttf']
+            else:
+                eco_board = chess.Board(eco_dict['fen'])
+                eco_ttf = cb.bitboards2ttf(eco_board, ttf_font_name,
+                                           eco_board.turn if orientation == 'turn'
+                                           else orientation == 'white')
             eco_tbl = doc.add_table(2, 1)
             eco_row = eco_tbl.rows[0]
-            eco_row.cells[0].text = cb.board2ttf(eco_board)[:-1]
+            eco_row.cells[0].text = eco_ttf[:-1]
             eco_cell_paragraph = eco_row.cells[0].paragraphs[0]
             eco_cell_paragraph.paragraph_format.line_spacing_rule = WD_LINE_SPACING.SINGLE
             eco_cell_paragraph.paragraph_format.keep_with_next = True
@@ -292,21 +670,10 @@ def gen_document_from_game(game_dict: dict,
     doc.add_page_break()
 
     #  PGN diagramms --------------------------------------
-    # the PGN data for diagram genration
-    boards_df = prep_ttfboards_from_pgn(game_dict['pgn'])
-
-    def gen_brd_cell(cell,
-                     ttf_str: str,
-                     sq_check: str,
-                     sq_from: str,
-                     sq_to: str):
-        # make parts according the squares to mark
-        ttf_parts_df = cb.divide_ttf_str(ttf_str,
-                                         sq_check,
-                                         sq_from,
-                                         sq_to)
-
-        for index, ttf_part in enumerate(ttf_parts_df['part']):
+
+    def gen_brd_cell(cell, diagram: tuple):
+        # the parts according the squares to mark
+        for ttf_part, part_type in diagram:
             brd_cell_paragraph = cell.paragraphs[0]
             brd_cell_paragraph.paragraph_format.line_spacing_rule = WD_LINE_SPACING.SINGLE
             brd_cell_paragraph.paragraph_format.keep_with_next = True
@@ -316,12 +683,12 @@ def gen_document_from_game(game_dict: dict,
             run.font.name = ttf_font_name
 
             # black
-            if ttf_parts_df.iloc[index]['type'] == 'norm':
+            if part_type == 'norm':
                 run.font.color.rgb = RGBColor(0x00, 0x00, 0x00)
                 run.font.size = Pt(16)
 
             # red for king in check
-            if ttf_parts_df.iloc[index]['type'] == 'sq_check':
+            if part_type == 'sq_check':
                 #run.font.color.rgb = RGBColor(0xff, 0x00, 0x00)
                 #run.font.size = Pt(16)
                 tag = run._r
@@ -333,7 +700,7 @@ def gen_document_from_game(game_dict: dict,
                 tag.rPr.append(shd)
 
             # lightgreen for sq_from and sq_to squares
-            if ttf_parts_df.iloc[index]['type'] in ('sq_from', 'sq_to'):
+            if part_type in ('sq_from', 'sq_to'):
                 tag = run._r
                 shd = OxmlElement('w:shd')
                 shd.set(qn('w:val'), 'clear')
@@ -342,42 +709,36 @@ def gen_document_from_game(game_dict: dict,
                 run.font.size = Pt(16)
                 tag.rPr.append(shd)
 
-    boards_tbl = doc.add_table(2*len(boards_df), 2)
-    for index, fmv in boards_df.iterrows():
+    boards_tbl = doc.add_table(2*len(move_table), 2)
+    for index, fmv in enumerate(move_table):
 
         brd_row = boards_tbl.rows[2*index]
 
         # the board diagrams
-        gen_brd_cell(brd_row.cells[0],
-                     fmv['w_board_ttf'][:-1],
-                     fmv['w_sq_check'],
-                     fmv['w_sq_from'],
-                     fmv['w_sq_to'])
-
-        gen_brd_cell(brd_row.cells[1],
-                     fmv['b_board_ttf'][:-1],
-                     fmv['b_sq_check'],
-                     fmv['b_sq_from'],
-                     fmv['b_sq_to'])
+        gen_brd_cell(brd_row.cells[0], fmv.w_diagram)
+
+        gen_brd_cell(brd_row.cells[1], fmv.b_diagram)
 
         # the SAN below the board diagrams
         # if last move, add result
-        if index == len(boards_df)-1:
-            if len(fmv['b_hmv_str']) == 0:
-                fmv['w_hmv_str'] = fmv['w_hmv_str'] + \
-                    '   ' + game_dict['Result']
+        w_hmv_str = fmv.w_hmv_str
+        b_hmv_str = fmv.b_hmv_str
+        if index == len(move_table)-1:
+            if len(b_hmv_str) == 0:
+                w_hmv_str = w_hmv_str + \
+                    '   ' + headers['Result']
             else:
-                fmv['b_hmv_str'] = fmv['b_hmv_str'] + \
-                    '   ' + game_dict['Result']
+                b_hmv_str = b_hmv_str + \
+                    '   ' + headers['Result']
 
         brd_row = boards_tbl.rows[2*index+1]
 
-        brd_row.cells[0].text = fmv['w_hmv_str']
+        brd_row.cells[0].text = w_hmv_str
         brd_row.cells[0].paragraphs[0].style.font.name = 'Verdana'
         brd_row.cells[0].paragraphs[0].style.font.size = Pt(9)
         brd_row.cells[0].paragraphs[0].paragraph_format.space_after = Pt(0)
 
-        brd_row.cells[1].text = fmv['b_hmv_str']
+        brd_row.cells[1].text = b_hmv_str
         brd_row.cells[1].paragraphs[0].style.font.name = 'Verdana'
         brd_row.cells[0].paragraphs[0].style.font.size = Pt(9)
         brd_row.cells[1].paragraphs[0].paragraph_format.space_after = Pt(0)
@@ -386,8 +747,9 @@ def gen_document_from_game(game_dict: dict,
     return doc
 
 
-def get_incremented_filename(filename: str) -> str:
-    """Return the given filename if exists with an increment"""
+def get_incremented_filename(filename: str, reserved=None) -> str:
+    """Return the given filename if exists with an increment;
+    filenames at the set reserved count as existing, too"""
     name, ext = os.path.splitext(filename)
     seq = 0
     # continue from existing sequence number if any
@@ -396,7 +758,8 @@ def get_incremented_filename(filename: str) -> str:
         name = rex[1]
         seq = int(rex[2])
 
-    while os.path.exists(filename):
+    while os.path.exists(filename) or \
+            (reserved is not None and filename in reserved):
         seq += 1
         filename = f"{name}-{seq}{ext}"
     return filename
@@ -413,6 +776,150 @@ def store_document(doc: Document, file_name: str) -> dict:
             'file_name': file_name})
 
 
+def get_eco_data_for_game(game: GameRecord, eco_by_position=False, eco_db='default') -> dict:
+    """Return the ECO data for the game, by its ECO tag, if any, and its pgn,
+    out of the ECO database eco_db;
+    eco_by_position classifies by the book positions the game passes through;
+    a game from a set-up position passes no opening's move sequence,
+    as at eco.get_eco_data_for_games(), but may pass its positions"""
+    eco_code = game.headers.get('ECO', '')
+    if game.analysis is not None:
+        # the game is already replayed
+        if eco_by_position:
+            return eco.get_eco_data_for_hashes(game.analysis.position_hashes(),
+                                               eco_code, eco_db)
+        if game.analysis.first_fen != chess.STARTING_FEN:
+            return {}
+        return eco.get_eco_data_for_sans(game.analysis.sans, eco_code, eco_db)
+    if 'FEN' in game.headers:
+        return {}
+    return eco.new_get_eco_data_for(eco=eco_code,
+                                    pgn=game.pgn,
+                                    by_position=eco_by_position,
+                                    eco_db=eco_db)
+
+
+def gen_docx_filename(game: GameRecord, docx_dir='DOCX/') -> str:
+    """Return the docx file name for the game:
+    '<docx_dir><Date>_<Event>_<Site>_( <White> - <Black> ).docx'"""
+    headers = game.headers
+    # fn fix for lichess pgn files
+    event = headers['Event'].replace(
+        '/', '_').replace(':', '_').replace('.', '-')
+    site = headers['Site'].replace(
+        '/', '_').replace(':', '_').replace('.', '-')
+
+    fname = docx_dir + headers['Date'].replace('.', '-') + '_' + \
+        event + '_' + \
+        site + '_( ' + \
+        headers['White'] + ' - ' + \
+        headers['Black'] + ' ).docx'
+    return fname.replace('??', '_')
+
+
+def get_render_settings(ttf_font_name='Chess Merida',
+                        eco_by_position=False,
+                        eco_db='default',
+                        orientation='white') -> dict:
+    """Return the settings a game's document depends on, next to the game itself"""
+    return {'font': ttf_font_name,
+            'layout': 'A4',
+            'orientation': orientation,
+            'eco_by_position': eco_by_position,
+            'eco_db': eco_db,
+            'version': RENDER_VERSION}
+
+
+def render_document(game: GameRecord,
+                    ttf_font_name='Chess Merida',
+                    eco_by_position=False,
+                    eco_db='default',
+                    orientation='white') -> Document:
+    """Return the docx.Document of the game, incl. its ECO lookup,
+    None if no document can be generated, e.g. for a game without pgn"""
+    if game.analysis is not None and len(game.analysis) == 0:
+        print('no docx will be generated for game, as there are no moves')
+        print(game)
+        print('\n')
+        return None
+    try:
+        eco_result_dict = get_eco_data_for_game(game,
+                                                eco_by_position=eco_by_position,
+                                                eco_db=eco_db)
+    except AttributeError as err:
+        print(f"\nUnexpected {err=}, {type(err)=}")
+        print('no docx will be generated for game, as there is no pgn')
+        print(game)
+        print('\n')
+        return None
+
+    return gen_document_from_game(game,
+                                  eco_result_dict,
+                                  ttf_font_name=ttf_font_name,
+                                  orientation=orientation)
+
+
+def render_game(game: GameRecord,
+                docx_fn: str,
+                ttf_font_name='Chess Merida',
+                eco_by_position=False,
+                eco_db='default',
+                orientation='white') -> dict:
+    """Return a dict{'done' : True/False,
+    'file_name' : <file_name>} after the game's ECO lookup,
+    document generation and storage at docx_fn"""
+    my_doc = render_document(game, ttf_font_name=ttf_font_name,
+                             eco_by_position=eco_by_position,
+                             eco_db=eco_db,
+                             orientation=orientation)
+    if my_doc is None:
+        return {'done': False,
+                'file_name': docx_fn}
+    return store_document(my_doc, docx_fn)
+
+
+def render_game_bytes(game: GameRecord,
+                      ttf_font_name='Chess Merida',
+                      eco_by_position=False,
+                      eco_db='default',
+                      orientation='white') -> bytes:
+    """Return the game's document as docx file content, to be
+    stored by store_document_bytes(), None if no document is generated"""
+    my_doc = render_document(game, ttf_font_name=ttf_font_name,
+                             eco_by_position=eco_by_position,
+                             eco_db=eco_db,
+                             orientation=orientation)
+    if my_doc is None:
+        return None
+    docx_bytes = io.BytesIO()
+    my_doc.save(docx_bytes)
+    return docx_bytes.getvalue()
+
+
+def store_document_bytes(docx_bytes: bytes, file_name: str) -> dict:
+    """Return a dict{'done' : True,
+    'file_name' : <file_name>} after
+    the docx file content is stored at 'file_name'"""
+    file_name = get_incremented_filename(file_name)
+    with open(file_name, 'wb') as docx_file:
+        docx_file.write(docx_bytes)
+    # check that file name ist stored
+    return({'done': os.path.exists(file_name),
+            'file_name': file_name})
+
+
+def init_worker(eco_db='default', diagram_cache_size=cb.DIAGRAM_CACHE_SIZE, diagrams=()):
+    """Initializer of a worker process that renders games:
+    the ECO data is loaded once per worker, not once per game,
+    and kept off the garbage collector for the worker's lifetime;
+    the worker starts with the (key, diagram) items of diagrams cached"""
+    eco.get_eco_data(eco_db)
+    gc.freeze()
+    cb.DIAGRAM_CACHE.resize(diagram_cache_size)
+    for key, diagram in diagrams:
+        cb.DIAGRAM_CACHE.put(key, diagram)
+
+
 def main():
     """some test for the pgn.py"""
     ##################################################
@@ -427,39 +934,15 @@ def main():
     pgn_name = 'test/pgn/test_do_not_change.pgn'
 
     # start to get the games out of one pgn file
-    games_df = get_games_from_pgnfile(pgn_name)
-
-    one_game_dict = games_df.iloc[1].to_dict()
-
-    eco_result_dict = {}
-    if 'ECO' in one_game_dict.keys():
-        eco_result_dict = \
-            eco.new_get_eco_data_for(eco=one_game_dict['ECO'],
-                                     pgn=one_game_dict['pgn'])
-    else:
-        eco_result_dict = \
-            eco.new_get_eco_data_for(eco='',
-                                     pgn=one_game_dict['pgn'])
-
-    my_doc = gen_document_from_game(one_game_dict,
-                                    eco_result_dict)
-
-    # fn fix for lichess pgn files
-    event = one_game_dict['Event'].replace(
-        '/', '_').replace(':', '_').replace('.', '-')
-    site = one_game_dict['Site'].replace(
-        '/', '_').replace(':', '_').replace('.', '-')
+    games = iter_games_from_pgnfile(pgn_name)
 
-    fname = 'test/docx/' + one_game_dict['Date'].replace('.', '-') + \
-            '_' + \
-            event + '_' + \
-            site + '_( ' + \
-            one_game_dict['White'] + ' - ' + \
-            one_game_dict['Black'] + ' ).docx'
-    fname = fname.replace('??', '_')
+    # the 2nd game of the file
+    next(games)
+    one_game = next(games)
 
-    # store document
-    ret_dict = store_document(my_doc, fname)
+    # render and store document
+    ret_dict = render_game(one_game,
+                           gen_docx_filename(one_game, docx_dir='test/docx/'))
     print('stored:', ret_dict['file_name'])
 
     return()
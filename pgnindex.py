@@ -0,0 +1,337 @@
+# pylint: disable=import-error
+"""functions for the byte-offset index of pgn files"""
+
+import bz2
+import codecs
+import contextlib
+import gzip
+import io
+import lzma
+import mmap
+import operator
+import os
+import os.path
+import re
+
+import numpy as np
+import pandas as pd
+
+# stdlib decompressors for the compressed pgn files
+COMPRESSION_DICT = {
+    '.gz': gzip,
+    '.bz2': bz2,
+    '.xz': lzma
+}
+
+# buffer size for reading and decompressing pgn files
+READ_BUFFER_SIZE = 1024 * 1024
+
+# the text encoding of all pgn files, whichever way they are read: UTF-8,
+# with the bytes that are no UTF-8 taken as Latin-1, the encoding of the PGN standard
+PGN_ENCODING = 'utf-8'
+PGN_ERRORS = 'pgn-latin-1'
+
+
+def _latin1_fallback(err: UnicodeDecodeError) -> tuple:
+    """Return the bytes that are no UTF-8 decoded as Latin-1, see PGN_ERRORS"""
+    return err.object[err.start:err.end].decode('latin-1'), err.end
+
+
+codecs.register_error(PGN_ERRORS, _latin1_fallback)
+
+
+def decode_pgn(data) -> str:
+    """Return the bytes-like pgn data as text, see PGN_ENCODING"""
+    return bytes(data).decode(PGN_ENCODING, PGN_ERRORS)
+
+
+# the sidecar index of 'games.pgn' is 'games.pgn.idx':
+# a stamp line, a line with the number of games N, the offsets and lengths
+# as N * 2 little-endian int64, to be memory-mapped, then the key headers as csv
+INDEX_EXT = '.idx'
+
+# the dtype of the sidecar index' offsets and lengths
+INDEX_DTYPE = np.dtype('<i8')
+
+# the key headers stored at the index, next to the byte offsets
+INDEX_HEADERS = ['Event', 'Site', 'Date', 'Round',
+                 'White', 'Black', 'Result', 'ECO']
+
+INDEX_COLUMNS = ['offset', 'length'] + INDEX_HEADERS
+
+# a game starts with its first tag pair,
+# i.e. a tag line after a blank line, or at the start of the file, see FIRST_GAME_REGEX;
+# searched without an alternative for the start of the file, that would slow it down
+GAME_START_REGEX = re.compile(rb'\n[ \t\r]*\n[ \t]*(\[[A-Za-z0-9_]+[ \t]+")')
+
+# the first game at the start of the file, maybe after a UTF-8 byte order mark
+FIRST_GAME_REGEX = re.compile(rb'(?:\xef\xbb\xbf)?[ \t]*(\[[A-Za-z0-9_]+[ \t]+")')
+
+# the blank line between the tag pairs and the movetext
+BLANK_LINE_REGEX = re.compile(rb'\n[ \t\r]*\n')
+
+# the game termination marker at the end of a game's movetext
+TERMINATION_REGEX = re.compile(rb'(?:^|[ \t])(?:1-0|0-1|1/2-1/2|\*)[ \t\r]*\n', re.M)
+
+# one tag pair of the game's headers
+TAG_REGEX = re.compile(rb'\[([A-Za-z0-9_]+)[ \t]+"(.*)"[ \t]*\]')
+
+
+def is_compressed(file_name: str) -> bool:
+    """Return whether the pgn file_name is compressed, e.g. 'games.pgn.gz'"""
+    return os.path.splitext(file_name)[1].lower() in COMPRESSION_DICT
+
+
+def open_pgn_binary(file_name: str):
+    """Return the pgn file_name opened for binary reading with a large buffer,
+    transparently decompressed for '.gz', '.bz2' and '.xz' files"""
+    ext = os.path.splitext(file_name)[1].lower()
+    if ext in COMPRESSION_DICT:
+        return io.BufferedReader(COMPRESSION_DICT[ext].open(file_name, 'rb'),
+                                 buffer_size=READ_BUFFER_SIZE)
+    return open(file_name, 'rb', buffering=READ_BUFFER_SIZE)
+
+
+@contextlib.contextmanager
+def open_pgn_bytes(file_name: str):
+    """Yield the bytes of the pgn file_name for read_game_text():
+    memory-mapped, or as decompressing stream for compressed files"""
+    if is_compressed(file_name):
+        with open_pgn_binary(file_name) as pgn_file:
+            yield pgn_file
+    elif os.path.getsize(file_name) == 0:
+        yield io.BytesIO(b'')
+    else:
+        with open(file_name, 'rb') as pgn_file, \
+                mmap.mmap(pgn_file.fileno(), 0, access=mmap.ACCESS_READ) as pgn_map:
+            yield pgn_map
+
+
+def get_index_filename(file_name: str) -> str:
+    """Return the file name of the sidecar index for the pgn file_name"""
+    return file_name + INDEX_EXT
+
+
+def _source_stamp(file_name: str) -> str:
+    """Return the stamp of the pgn file_name, its index is valid for"""
+    stat = os.stat(file_name)
+    return f'# pgn2docx index v2: size={stat.st_size} mtime_ns={stat.st_mtime_ns}\n'
+
+
+def find_game_starts(data) -> list:
+    """Return the positions of the first tag pair of each game at the bytes-like data"""
+    first_match = FIRST_GAME_REGEX.match(data)
+    starts = [] if first_match is None else [first_match.start(1)]
+    starts.extend(match.start(1) for match in GAME_START_REGEX.finditer(data))
+    return starts
+
+
+# the key headers as bytes, to look them up before decoding
+INDEX_HEADER_KEYS = [header.encode('ascii') for header in INDEX_HEADERS]
+
+# the key headers of a game without any of them
+EMPTY_INDEX_TAGS = dict.fromkeys(INDEX_HEADER_KEYS, b'')
+
+# the values of the key headers of a game's tags, as tuple
+get_index_tags = operator.itemgetter(*INDEX_HEADER_KEYS)
+
+
+def _scan_rows(data, base_offset=0, final=True) -> tuple:
+    """Return (columns, consumed) for the games at the bytes-like data:
+    the index columns, i.e. per INDEX_COLUMNS a list with one value per game,
+    and the number of bytes these games take;
+    if not final, the last game may continue beyond data and is left out"""
+    starts = find_game_starts(data)
+    if not final:
+        starts, last_start = starts[:-1], (starts[-1] if starts else 0)
+    ends = starts[1:] + [len(data) if final else last_start]
+    header_rows = []
+    for start, end in zip(starts, ends):
+        # the tag pairs end at the first blank line
+        blank_match = BLANK_LINE_REGEX.search(data, start, end)
+        headers_end = blank_match.start() if blank_match else end
+        tags = EMPTY_INDEX_TAGS.copy()
+        tags.update(TAG_REGEX.findall(data, start, headers_end))
+        header_rows.append(get_index_tags(tags))
+    columns = {'offset': [base_offset + start for start in starts],
+               'length': [end - start for start, end in zip(starts, ends)]}
+    header_columns = list(zip(*header_rows)) if header_rows else [()] * len(INDEX_HEADERS)
+    for header, values in zip(INDEX_HEADERS, header_columns):
+        # the same few events, players and results repeat, decode each once
+        decoded = {value: decode_pgn(value) for value in set(values)}
+        columns[header] = list(map(decoded.__getitem__, values))
+    return columns, (len(data) if final else last_start)
+
+
+def _index_frame(columns: dict) -> pd.DataFrame:
+    """Return the index DataFrame of the index columns"""
+    index_df = pd.DataFrame(columns, columns=INDEX_COLUMNS)
+    return index_df.astype({'offset': np.int64, 'length': np.int64})
+
+
+def scan_pgn_bytes(data, base_offset=0) -> pd.DataFrame:
+    """Return the index DataFrame for the games at the bytes-like data,
+    with one row per game: its offset, its length and its key headers"""
+    columns, _ = _scan_rows(data, base_offset)
+    return _index_frame(columns)
+
+
+def build_index(file_name: str) -> pd.DataFrame:
+    """Return the index DataFrame of the pgn file_name,
+    built with one scan over the memory-mapped file;
+    compressed files are scanned block by block while decompressing,
+    the offsets are then those of the decompressed data"""
+    if not is_compressed(file_name):
+        if os.path.getsize(file_name) == 0:
+            return scan_pgn_bytes(b'')
+        with open(file_name, 'rb') as pgn_file, \
+                mmap.mmap(pgn_file.fileno(), 0, access=mmap.ACCESS_READ) as pgn_map:
+            return scan_pgn_bytes(pgn_map)
+
+    columns = {column: [] for column in INDEX_COLUMNS}
+    with open_pgn_binary(file_name) as pgn_file:
+        data = b''
+        base_offset = 0
+        while True:
+            block = pgn_file.read(READ_BUFFER_SIZE)
+            data += block
+            block_columns, consumed = _scan_rows(data, base_offset, final=not block)
+            for column in INDEX_COLUMNS:
+                columns[column].extend(block_columns[column])
+            if not block:
+                break
+            # keep the last, maybe incomplete, game for the next block
+            data = data[consumed:]
+            base_offset += consumed
+    return _index_frame(columns)
+
+
+def write_index(file_name: str, index_df: pd.DataFrame) -> bool:
+    """Return True after the index_df is stored as sidecar of the pgn file_name,
+    False if the sidecar can not be written, e.g. at a read-only directory"""
+    offsets = index_df[['offset', 'length']].to_numpy(dtype=INDEX_DTYPE)
+    try:
+        with open(get_index_filename(file_name), 'wb') as idx_file:
+            idx_file.write(_source_stamp(file_name).encode('ascii'))
+            idx_file.write(f'# games={len(index_df)}\n'.encode('ascii'))
+            idx_file.write(offsets.tobytes())
+            idx_file.write(index_df[INDEX_HEADERS].to_csv(index=False).encode('utf-8'))
+    except OSError:
+        return False
+    return True
+
+
+def _read_index_head(idx_file, file_name: str):
+    """Return the number of games of the open sidecar index idx_file,
+    None if it is not valid for the pgn file_name, e.g. outdated"""
+    if idx_file.readline() != _source_stamp(file_name).encode('ascii'):
+        return None
+    games_line = idx_file.readline()
+    if not games_line.startswith(b'# games='):
+        return None
+    return int(games_line[len(b'# games='):])
+
+
+def load_offsets(file_name: str, rebuild=False) -> np.ndarray:
+    """Return the offsets and lengths of the games of the pgn file_name,
+    as ndarray (N, 2), memory-mapped from its sidecar, i.e. without reading
+    the whole index; the sidecar is (re)built if missing, outdated or rebuild is requested"""
+    idx_name = get_index_filename(file_name)
+    if not rebuild and os.path.isfile(idx_name):
+        with open(idx_name, 'rb') as idx_file:
+            games = _read_index_head(idx_file, file_name)
+            head_size = idx_file.tell()
+        if games == 0:
+            return np.empty((0, 2), dtype=INDEX_DTYPE)
+        if games is not None:
+            return np.memmap(idx_name, dtype=INDEX_DTYPE, mode='r',
+                             offset=head_size, shape=(games, 2))
+    index_df = load_index(file_name, rebuild=True)
+    return index_df[['offset', 'length']].to_numpy(dtype=INDEX_DTYPE)
+
+
+def load_index(file_name: str, rebuild=False) -> pd.DataFrame:
+    """Return the index DataFrame of the pgn file_name, read from its sidecar;
+    the sidecar is (re)built if missing, outdated or rebuild is requested"""
+    idx_name = get_index_filename(file_name)
+    if not rebuild and os.path.isfile(idx_name):
+        with open(idx_name, 'rb') as idx_file:
+            games = _read_index_head(idx_file, file_name)
+            if games is not None:
+                offsets = np.frombuffer(idx_file.read(games * 2 * INDEX_DTYPE.itemsize),
+                                        dtype=INDEX_DTYPE).reshape(games, 2)
+                headers_df = pd.read_csv(idx_file, encoding='utf-8',
+                                         dtype={header: str for header in INDEX_HEADERS},
+                                         keep_default_na=False)
+                index_df = pd.DataFrame({'offset': offsets[:, 0], 'length': offsets[:, 1]})
+                return pd.concat([index_df, headers_df], axis=1)
+    index_df = build_index(file_name)
+    write_index(file_name, index_df)
+    return index_df
+
+
+def find_complete_end(data) -> int:
+    """Return the number of bytes of the bytes-like data, that hold complete games,
+    i.e. the position after the last game termination marker, e.g. '1-0',
+    followed by a newline; 0 if there is no complete game"""
+    end = 0
+    for match in TERMINATION_REGEX.finditer(data):
+        end = match.end()
+    return end
+
+
+def split_pgnfile(file_name: str, parts: int) -> list:
+    """Return up to parts (start, end) byte ranges of the pgn file_name,
+    of about equal size and aligned on game boundaries,
+    i.e. each range starts with the first tag pair of a game;
+    compressed files can not be split, as they do not allow random access"""
+    if is_compressed(file_name):
+        raise ValueError(f'compressed file can not be split: {file_name}')
+    size = os.path.getsize(file_name)
+    if size == 0:
+        return []
+    with open(file_name, 'rb') as pgn_file, \
+            mmap.mmap(pgn_file.fileno(), 0, access=mmap.ACCESS_READ) as pgn_map:
+        starts = [0]
+        for part in range(1, max(1, parts)):
+            # the next game start after this part's share of bytes
+            pos = max(size * part // parts, starts[-1] + 1)
+            match = GAME_START_REGEX.search(pgn_map, pos - 1)
+            if match is None:
+                break
+            if match.start(1) > starts[-1]:
+                starts.append(match.start(1))
+    return list(zip(starts, starts[1:] + [size]))
+
+
+def read_game_text(pgn_bytes, offset: int, length: int) -> io.StringIO:
+    """Return the pgn text of one game, read at its offset of the pgn_bytes
+    as given by open_pgn_bytes(), ready for 'chess.pgn.read_game'"""
+    # seeking forward at a compressed stream decompresses up to the offset,
+    # so read the games in order of their offsets
+    pgn_bytes.seek(offset)
+    return io.StringIO(decode_pgn(pgn_bytes.read(length)))
+
+
+def split_index(index_df: pd.DataFrame, parts: int) -> list:
+    """Return up to parts (start, stop) ranges of game numbers,
+    balanced by their byte size, as independent work units"""
+    if len(index_df) == 0:
+        return []
+    parts = max(1, min(parts, len(index_df)))
+    ends = (index_df['offset'] + index_df['length']).to_numpy()
+    first = int(index_df['offset'].iloc[0])
+    total = int(ends[-1]) - first
+    ranges = []
+    start = 0
+    for part in range(1, parts + 1):
+        if start >= len(index_df):
+            break
+        # all games that end within this part's share of bytes,
+        # but at least one game per part
+        stop = int(np.searchsorted(ends, first + total * part // parts, side='right'))
+        stop = max(stop, start + 1)
+        stop = min(stop, len(index_df))
+        ranges.append((start, stop))
+        start = stop
+    return ranges
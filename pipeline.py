@@ -0,0 +1,160 @@
+# pylint: disable=import-error
+"""staged pipeline for the docx generation: parse --> render --> write
+
+  - parse:  one thread streams the (game, docx_fn) tasks
+            out of the pgn files into a bounded queue
+  - render: render_jobs worker processes generate the documents
+            as docx file content (bytes), CPU bound
+  - write:  write_jobs threads store the docx files, I/O bound
+
+Each stage has a bounded number of pending items, so a slow stage
+stalls the stages before it, instead of growing the memory."""
+
+import collections
+import functools
+import queue
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+
+import chessboard as cb
+import eco
+import pgn
+
+# marks the end of the parse stage's tasks
+_END_OF_TASKS = object()
+
+
+def _parse_stage(tasks, task_queue: queue.Queue, stop: threading.Event):
+    """Put all tasks into the task_queue, followed by _END_OF_TASKS;
+    an exception while parsing is put into the queue, too"""
+    try:
+        for task in tasks:
+            while not stop.is_set():
+                try:
+                    task_queue.put(task, timeout=0.1)
+                    break
+                except queue.Full:
+                    continue
+            if stop.is_set():
+                return
+        task_queue.put(_END_OF_TASKS)
+    except BaseException as err:  # pylint: disable=broad-except
+        task_queue.put(err)
+
+
+def _iter_parsed(tasks, queue_size: int):
+    """Yield the tasks, as parsed at a separate thread ahead of the consumer"""
+    task_queue = queue.Queue(maxsize=queue_size)
+    stop = threading.Event()
+    parser = threading.Thread(target=_parse_stage,
+                              args=(tasks, task_queue, stop),
+                              name='pgn2docx-parse', daemon=True)
+    parser.start()
+    try:
+        while True:
+            task = task_queue.get()
+            if task is _END_OF_TASKS:
+                return
+            if isinstance(task, BaseException):
+                raise task
+            yield task
+    finally:
+        stop.set()
+
+
+def _render_task(task: tuple, ttf_font_name: str, eco_by_position: bool,
+                 eco_db: str, orientation: str) -> tuple:
+    """Return (docx_bytes, docx_fn, cache_counts) for a (game, docx_fn) task,
+    cache_counts are the (hits, misses) of the diagram cache while rendering"""
+    game, docx_fn = task
+    hits, misses = cb.DIAGRAM_CACHE.hits, cb.DIAGRAM_CACHE.misses
+    docx_bytes = pgn.render_game_bytes(game, ttf_font_name=ttf_font_name,
+                                       eco_by_position=eco_by_position,
+                                       eco_db=eco_db,
+                                       orientation=orientation)
+    return docx_bytes, docx_fn, (cb.DIAGRAM_CACHE.hits - hits,
+                                 cb.DIAGRAM_CACHE.misses - misses)
+
+
+def _write_task(rendered: tuple) -> dict:
+    """Return the result of storing the rendered (docx_bytes, docx_fn, cache_counts)"""
+    docx_bytes, docx_fn, _ = rendered
+    if docx_bytes is None:
+        return {'done': False,
+                'file_name': docx_fn}
+    return pgn.store_document_bytes(docx_bytes, docx_fn)
+
+
+def _rendered(future: Future, at_worker: bool) -> tuple:
+    """Return the rendered (docx_bytes, docx_fn, cache_counts) of the future;
+    the counts of a worker's diagram cache are added to this process' counters"""
+    rendered = future.result()
+    if at_worker:
+        hits, misses = rendered[2]
+        cb.DIAGRAM_CACHE.hits += hits
+        cb.DIAGRAM_CACHE.misses += misses
+    return rendered
+
+
+def _done_future(result) -> Future:
+    """Return a finished Future with the given result"""
+    future = Future()
+    future.set_result(result)
+    return future
+
+
+def run_pipeline(tasks,
+                 render_jobs=1,
+                 write_jobs=2,
+                 queue_size=16,
+                 ttf_font_name='Chess Merida',
+                 eco_by_position=False,
+                 eco_db='default',
+                 orientation='white'):
+    """Yield the results dict{'done' : True/False, 'file_name' : <file_name>}
+    of the (game, docx_fn) tasks, in the order of the tasks;
+    with render_jobs == 1 the documents are rendered in this process, else at
+    worker processes started by pgn.WORKER_CONTEXT, not forked from this one;
+    the workers' diagram cache hits and misses are added to this process' counters"""
+    render = functools.partial(_render_task, ttf_font_name=ttf_font_name,
+                               eco_by_position=eco_by_position,
+                               eco_db=eco_db,
+                               orientation=orientation)
+    render_pool = None
+    if render_jobs > 1:
+        # compile the ECO snapshot once, if missing, before the workers load it
+        eco.get_eco_data(eco_db)
+        render_pool = ProcessPoolExecutor(max_workers=render_jobs,
+                                          mp_context=pgn.WORKER_CONTEXT,
+                                          initializer=pgn.init_worker,
+                                          initargs=(eco_db, cb.DIAGRAM_CACHE.maxsize,
+                                                    list(cb.DIAGRAM_CACHE.diagrams.items())))
+    write_pool = ThreadPoolExecutor(max_workers=write_jobs,
+                                    thread_name_prefix='pgn2docx-write')
+    rendering = collections.deque()
+    writing = collections.deque()
+    try:
+        for task in _iter_parsed(tasks, queue_size):
+            if render_pool is None:
+                rendering.append(_done_future(render(task)))
+            else:
+                rendering.append(render_pool.submit(render, task))
+            # hand the oldest rendered document to the writers
+            if len(rendering) >= 2 * render_jobs:
+                writing.append(write_pool.submit(_write_task,
+                                                 _rendered(rendering.popleft(),
+                                                           render_pool is not None)))
+            if len(writing) >= queue_size:
+                yield writing.popleft().result()
+            while writing and writing[0].done():
+                yield writing.popleft().result()
+        while rendering:
+            writing.append(write_pool.submit(_write_task,
+                                             _rendered(rendering.popleft(),
+                                                       render_pool is not None)))
+        while writing:
+            yield writing.popleft().result()
+    finally:
+        if render_pool is not None:
+            render_pool.shutdown(cancel_futures=True)
+        write_pool.shutdown()
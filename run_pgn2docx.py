@@ -1,5 +1,8 @@
 """generates the docx form given pgn by usage of module pgn2docx"""
 
+import argparse
+import collections
+import os
 import os.path
 import sys
 
@@ -10,11 +13,98 @@ import sys
 #from docx.oxml import OxmlElement, ns
 #from docx.shared import Inches, Mm, Pt
 
+import chessboard as cb
 import eco
+import manifest
 import pgn
-
-
-def main():
+import pipeline
+import watch
+
+
+def parse_args(argv=None) -> argparse.Namespace:
+    """Return the command line options"""
+    parser = argparse.ArgumentParser(
+        description='generates a docx file for each game of the pgn files at PGN/')
+    parser.add_argument('-j', '--jobs', type=int, default=1,
+                        help='number of worker processes that render the games, '
+                        '0 for one per CPU core (default: %(default)s)')
+    parser.add_argument('--watch', action='store_true',
+                        help='keep running and render the games appended to the pgn files '
+                        'as they arrive; each file is read from where the last run stopped')
+    parser.add_argument('--force', action='store_true',
+                        help='render all games, even those already rendered '
+                        'with the same settings, as noted at the docx directory\'s manifest')
+    parser.add_argument('--eco-by-position', action='store_true',
+                        help='classify the openings by the book positions the games pass through, '
+                        'i.e. find openings reached by a different move order, too')
+    parser.add_argument('--eco-db', default='default', metavar='DB',
+                        help='the ECO database to classify the openings with: '
+                        f'{", ".join(eco.ECO_DB_DICT)} or an ECO csv file, '
+                        'e.g. en_2k for quick previews (default: %(default)s)')
+    parser.add_argument('--font', default='Chess Merida', choices=list(cb.FONT_REGISTRY),
+                        help='the chess TTF of the diagrams, it has to be installed '
+                        'where the docx files are viewed (default: %(default)s)')
+    parser.add_argument('--orientation', default='white', choices=pgn.ORIENTATIONS,
+                        help='the view of the diagrams: from White, from Black, '
+                        'or each from the side to move (default: %(default)s)')
+    parser.add_argument('--diagram-cache', type=int, default=cb.DIAGRAM_CACHE_SIZE, metavar='N',
+                        help='max. number of diagrams cached per process, e.g. those of '
+                        'the openings repeated at many games, 0 for no cache; it pays '
+                        'off from a hit rate of about 27%% (default: %(default)s)')
+    parser.add_argument('--diagram-cache-file', metavar='FILE',
+                        help='keep the diagram cache at FILE across runs: read at the start, '
+                        'stored at the end with the diagrams rendered by this process, '
+                        'i.e. with --jobs 1 or --watch')
+    parser.add_argument('--parse-jobs', type=int, default=1,
+                        help='number of worker processes that parse each pgn file '
+                        'in chunks, 0 for one per CPU core (default: %(default)s)')
+    parser.add_argument('--writers', type=int, default=2,
+                        help='number of threads that store the docx files '
+                        '(default: %(default)s)')
+    parser.add_argument('--queue-size', type=int, default=16,
+                        help='max. number of parsed games, resp. rendered documents, '
+                        'waiting for the next stage (default: %(default)s)')
+    filters = parser.add_argument_group(
+        'filters', 'render only the games whose headers match all given filters')
+    filters.add_argument('--player',
+                         help='part of the White or Black tag, case insensitive')
+    filters.add_argument('--event',
+                         help='part of the Event tag, case insensitive')
+    filters.add_argument('--date-from', metavar='YYYY.MM.DD',
+                         help='first Date, inclusive')
+    filters.add_argument('--date-to', metavar='YYYY.MM.DD',
+                         help='last Date, inclusive')
+    filters.add_argument('--eco-from', metavar='ECO',
+                         help='first ECO code, inclusive, e.g. B20')
+    filters.add_argument('--eco-to', metavar='ECO',
+                         help='last ECO code, inclusive, e.g. B99')
+    filters.add_argument('--result', choices=['1-0', '0-1', '1/2-1/2', '*'],
+                         help='the Result tag')
+    args = parser.parse_args(argv)
+    try:
+        eco_db_filename = eco.get_eco_db_filename(args.eco_db)
+    except eco.EcoDataError as err:
+        parser.error(str(err))
+    if not os.path.isfile(eco_db_filename):
+        parser.error(f'ECO database file \'{eco_db_filename}\' does not exist')
+    return args
+
+
+def get_header_filter(args: argparse.Namespace):
+    """Return the header filter for the given options, None if no filter is given"""
+    criteria = {'player': args.player,
+                'event': args.event,
+                'date_from': args.date_from,
+                'date_to': args.date_to,
+                'eco_from': args.eco_from,
+                'eco_to': args.eco_to,
+                'result': args.result}
+    if all(value is None for value in criteria.values()):
+        return None
+    return pgn.make_header_filter(**criteria)
+
+
+def main(argv=None):
     """Return the generated docx"""
     ##################################################
     # for development just use
@@ -24,66 +114,112 @@ def main():
     #   'DOCX/TEST'
     # (you have to run this 'pgn.py')
     ##################################################
+    args = parse_args(argv)
+    if args.jobs < 1:
+        args.jobs = os.cpu_count() or 1
+    if args.parse_jobs < 1:
+        args.parse_jobs = os.cpu_count() or 1
+    header_filter = get_header_filter(args)
+
     pgn_dir = 'PGN'
     if not os.path.isdir(pgn_dir):
         print(f'directory \'{pgn_dir}\' does not exits, please create it.')
         sys.exit(1)
     file_names_list = pgn.get_pgnfile_names_from_dir(pgn_dir=pgn_dir)
 
-    for fname in file_names_list:
-        try:
-            # check if file exists
-            file_obj = open(fname, 'r')
-            file_obj.close()
-
-        except IOError:
-            print("File not accessible: ", fname)
-            continue
-        finally:
-            file_obj.close()
-
-        # start to get the games out of one pgn file
-        games_df = pgn.get_games_from_pgnfile(fname)
-
-        for index in range(len(games_df)):
-            one_game_dict = games_df.iloc[index].to_dict()
-
+    docx_dir = 'DOCX/'
+    ttf_font_name = args.font
+    settings = pgn.get_render_settings(ttf_font_name,
+                                       eco_by_position=args.eco_by_position,
+                                       eco_db=args.eco_db,
+                                       orientation=args.orientation)
+    manifest_dict = {} if args.force else manifest.load_manifest(docx_dir)
+    cb.DIAGRAM_CACHE.resize(args.diagram_cache)
+    if args.diagram_cache_file is not None:
+        cb.DIAGRAM_CACHE.load(args.diagram_cache_file)
+    reserved_fns = set()
+    # the game keys of the tasks, in the order of the tasks
+    task_keys = collections.deque()
+    queued_keys = set()
+
+    def gen_game_tasks(games):
+        for one_game in games:
+            key = manifest.game_key(one_game, settings)
+            if key in queued_keys or manifest.is_rendered(manifest_dict, key):
+                continue
+            queued_keys.add(key)
+            # file names are given in pgn order, independent of the
+            # order the documents are finished at parallel rendering
+            docx_fn = pgn.get_incremented_filename(
+                pgn.gen_docx_filename(one_game, docx_dir=docx_dir),
+                reserved=reserved_fns)
+            reserved_fns.add(docx_fn)
+            task_keys.append(key)
+            yield one_game, docx_fn
+
+    def gen_tasks():
+        for fname in file_names_list:
             try:
-                eco_result_dict = {}
-                if 'ECO' in one_game_dict.keys():
-                    eco_result_dict = eco.new_get_eco_data_for(
-                        eco=one_game_dict['ECO'],
-                        pgn=one_game_dict['pgn'])
-                else:
-                    eco_result_dict = eco.new_get_eco_data_for(
-                        eco='',
-                        pgn=one_game_dict['pgn'])
-            except AttributeError as err:
-                print(f"\nUnexpected {err=}, {type(err)=}")
-                print('no docx will be generated for game, as there is no pgn')
-                print(one_game_dict)
-                print('\n')
+                # check if file exists
+                with open(fname, 'r', encoding='utf-8'):
+                    pass
+            except IOError:
+                print("File not accessible: ", fname)
                 continue
 
-            my_doc = pgn.gen_document_from_game(one_game_dict,
-                                                eco_result_dict,
-                                                ttf_font_name='Chess Merida')
-
-            # fn fix for lichess pgn files
-            event = one_game_dict['Event'].replace(
-                '/', '_').replace(':', '_').replace('.', '-')
-            site = one_game_dict['Site'].replace(
-                '/', '_').replace(':', '_').replace('.', '-')
-
-            docx_fn = 'DOCX/' + one_game_dict['Date'].replace('.', '-') + '_' + \
-                event + '_' + \
-                site + '_( ' + \
-                one_game_dict['White'] + ' - ' + \
-                one_game_dict['Black'] + ' ).docx'
-            docx_fn = docx_fn.replace('??', '_')
-
-            ret_dict = pgn.store_document(my_doc, docx_fn)
+            # stream the games out of one pgn file,
+            # each game is rendered as soon as it is parsed,
+            # games not matching the filters are skipped after their headers
+            yield from gen_game_tasks(
+                pgn.iter_games_from_pgnfile(fname, header_filter,
+                                            jobs=args.parse_jobs))
+
+    def stored(ret_dict: dict, manifest_file):
+        # results are given in the order of the tasks
+        key = task_keys.popleft()
+        if ret_dict['done']:
             print('stored:', ret_dict['file_name'])
+            manifest.append_entry(manifest_file, key, ret_dict['file_name'])
+
+    try:
+        with manifest.open_manifest(docx_dir) as manifest_file:
+            if args.watch:
+                # render the appended games at once, in this process,
+                # with its ECO data already loaded
+                state = watch.load_state(docx_dir)
+                print(f'watching \'{pgn_dir}\' for new games, stop with Ctrl-C')
+                try:
+                    for fname, games, offset in watch.iter_new_games(
+                            pgn_dir, state, header_filter):
+                        for one_game, docx_fn in gen_game_tasks(games):
+                            stored(pgn.render_game(one_game, docx_fn,
+                                                   ttf_font_name=ttf_font_name,
+                                                   eco_by_position=args.eco_by_position,
+                                                   eco_db=args.eco_db,
+                                                   orientation=args.orientation),
+                                   manifest_file)
+                        state[fname] = offset
+                        watch.store_state(docx_dir, state)
+                except KeyboardInterrupt:
+                    pass
+                return
+
+            for ret_dict in pipeline.run_pipeline(gen_tasks(),
+                                                  render_jobs=args.jobs,
+                                                  write_jobs=max(1, args.writers),
+                                                  queue_size=max(1, args.queue_size),
+                                                  ttf_font_name=ttf_font_name,
+                                                  eco_by_position=args.eco_by_position,
+                                                  eco_db=args.eco_db,
+                                                  orientation=args.orientation):
+                stored(ret_dict, manifest_file)
+    except eco.EcoDataError as err:
+        print(err)
+        sys.exit(1)
+    finally:
+        print(cb.DIAGRAM_CACHE.stats())
+        if args.diagram_cache_file is not None and args.diagram_cache > 0:
+            cb.DIAGRAM_CACHE.store(args.diagram_cache_file)
 
 
 if __name__ == '__main__':
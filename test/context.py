@@ -6,6 +6,11 @@ import sys
 
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
+import analysis
 import chessboard
 import eco
+import manifest
 import pgn
+import pgnindex
+import pipeline
+import watch
@@ -0,0 +1,63 @@
+"""Functions concerning the single replay analysis of a game's mainline"""
+import unittest
+
+import chess
+import chess.polyglot
+
+from context import analysis
+from context import pgn
+
+TEST_PGN = 'test/pgn/test_do_not_change.pgn'
+
+
+class TestAnalysis(unittest.TestCase):
+    """Collection of tests for analysis module"""
+
+    # Test 1
+    def test_analyze_pgn(self):
+        """checks SAN, squares, checks, hashes and snapshots per half move"""
+        game_analysis = analysis.analyze_pgn('1. e4 f5 2. Qh5+ g6')
+        self.assertEqual(len(game_analysis), 4)
+        self.assertEqual(game_analysis.sans, ['e4', 'f5', 'Qh5+', 'g6'])
+        self.assertEqual(game_analysis.from_squares[2], chess.D1)
+        self.assertEqual(game_analysis.to_squares[2], chess.H5)
+        self.assertEqual(game_analysis.check_squares, [None, None, chess.E8, None])
+        board = chess.Board()
+        for ply, san in enumerate(game_analysis.sans):
+            board.push_san(san)
+            self.assertEqual(list(game_analysis.position_hashes())[ply],
+                             chess.polyglot.zobrist_hash(board))
+            self.assertEqual(analysis.snapshot2board(game_analysis.snapshot(ply)),
+                             chess.BaseBoard(board.board_fen()))
+
+    # Test 2
+    def test_fullmove_number(self):
+        """checks move numbers and sides of a game starting with Black"""
+        board = chess.Board('rnbqkbnr/pppppppp/8/8/4P3/8/PPPP1PPP/RNBQKBNR b KQkq - 0 1')
+        game_analysis = analysis.analyze_moves(
+            [chess.Move.from_uci('e7e5'), chess.Move.from_uci('g1f3')], board)
+        self.assertEqual(game_analysis.sans, ['e5', 'Nf3'])
+        self.assertEqual([game_analysis.turn(ply) for ply in range(2)],
+                         [chess.BLACK, chess.WHITE])
+        self.assertEqual([game_analysis.fullmove_number(ply) for ply in range(2)], [1, 2])
+        board.push_san('e5')
+        board.push_san('Nf3')
+        self.assertEqual(list(game_analysis.position_hashes())[-1],
+                         chess.polyglot.zobrist_hash(board))
+
+    # Test 2b
+    def test_promotion_moves(self):
+        """the moves of the analysis keep their promotion piece"""
+        board = chess.Board('8/P6k/8/8/8/8/8/K7 w - - 0 1')
+        moves = [chess.Move.from_uci('a7a8n'), chess.Move.from_uci('h7g6')]
+        self.assertEqual(analysis.analyze_moves(moves, board).moves(), moves)
+
+    # Test 3
+    def test_mainline_visitor_analysis(self):
+        """the analysis made while parsing equals a replay of the pgn"""
+        for game in pgn.iter_games_from_pgnfile(TEST_PGN):
+            self.assertEqual(game.analysis, analysis.analyze_pgn(game.pgn))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -2,9 +2,13 @@
 # pylint: disable=import-error
 """Functions related to the chessboard"""
 
+import io
+import os.path
+import tempfile
 import unittest
 
 import chess
+import chess.pgn
 import numpy as np
 
 from context import chessboard as cb
@@ -285,6 +289,182 @@ class TestChessboard(unittest.TestCase):
         self.assertEqual(
             cb.board2ttf(board), ttf_str)
 
+    # Test 27
+    def test_bitboards2ttf(self):
+        """the direct TTF encoding equals board2ttf at each position of a game"""
+        board = chess.Board()
+        self.assertEqual(cb.bitboards2ttf(board), cb.board2ttf(board))
+        for san in ['e4', 'd5', 'exd5', 'c6', 'dxc6', 'Qd6', 'cxb7', 'Qe6+',
+                    'Be2', 'Nf6', 'bxa8=Q', 'Nc6', 'Nf3', 'Qd5', 'O-O']:
+            board.push_san(san)
+            self.assertEqual(cb.bitboards2ttf(board), cb.board2ttf(board))
+        # en passant
+        board = chess.Board('rnbqkbnr/ppp1p1pp/8/3pPp2/8/8/PPPP1PPP/RNBQKBNR w KQkq f6 0 3')
+        board.push_san('exf6')
+        self.assertEqual(cb.bitboards2ttf(board), cb.board2ttf(board))
+        self.assertEqual(cb.bitboards2ttf(chess.BaseBoard.empty()), cb.EMPTY_WHITE_TTF)
+
+    # Test 28
+    def test_patch_ttf(self):
+        """the patched TTF equals the full encoding after each move of whole games"""
+        with open('test/pgn/test_do_not_change.pgn', 'r', encoding='utf-8') as pgn_file:
+            while (game := chess.pgn.read_game(pgn_file)) is not None:
+                board = game.board()
+                ttf_str = cb.board2ttf(board)
+                for move in game.mainline_moves():
+                    old_board = board.copy()
+                    board.push(move)
+                    ttf_str = cb.patch_ttf(ttf_str, old_board, board)
+                    self.assertEqual(ttf_str, cb.board2ttf(board))
+        # castling, en passant and promotion with capture
+        for fen, san in [('r3k2r/8/8/8/8/8/8/R3K2R w KQkq - 0 1', 'O-O-O'),
+                         ('r3k2r/8/8/8/8/8/8/R3K2R b KQkq - 0 1', 'O-O'),
+                         ('4k3/8/8/3pP3/8/8/8/4K3 w - d6 0 2', 'exd6'),
+                         ('1n2k3/P7/8/8/8/8/8/4K3 w - - 0 1', 'axb8=N')]:
+            board = chess.Board(fen)
+            old_board = board.copy()
+            board.push_san(san)
+            self.assertEqual(cb.patch_ttf(cb.board2ttf(old_board), old_board, board),
+                             cb.board2ttf(board))
+
+    # Test 29
+    def test_snapshots2codes(self):
+        """all diagrams of a game encoded in one batch equal board2ttf"""
+        board = chess.Board()
+        snapshots = []
+        boards = []
+        for san in ['e4', 'd5', 'exd5', 'c6', 'dxc6', 'Qd6', 'cxb7', 'Qe6+',
+                    'Be2', 'Nf6', 'bxa8=Q', 'Nc6', 'Nf3', 'Qd5', 'O-O']:
+            board.push_san(san)
+            boards.append(board.copy())
+            snapshots.append([board.pawns, board.knights, board.bishops,
+                              board.rooks, board.queens, board.kings,
+                              board.occupied_co[chess.WHITE], board.occupied_co[chess.BLACK]])
+        codes = cb.snapshots2codes(np.array(snapshots, dtype=np.uint64))
+        self.assertEqual(codes.shape, (15, 10, 10))
+        self.assertEqual(codes.dtype, np.uint8)
+        self.assertEqual(cb.codes2ttf(codes), [cb.board2ttf(board) for board in boards])
+        self.assertEqual(cb.codes2ttf(cb.board2codes(board), 'Chess Leipzig'),
+                         cb.board2ttf(board))
+
+    # Test 30
+    def test_codes_flip(self):
+        """flipping and comparing boards of codes as with the cell strings"""
+        codes = cb.arr2codes(cb.START_WHITE_ARR)
+        self.assertTrue(np.array_equal(cb.codes2arr(codes), cb.START_WHITE_ARR))
+        self.assertTrue(np.array_equal(cb.codes_flip(codes), cb.arr2codes(cb.START_BLACK_ARR)))
+        self.assertTrue(cb.codes_isflipped(codes, cb.arr2codes(cb.START_BLACK_ARR)))
+        self.assertFalse(cb.codes_isflipped(codes, codes))
+        batch = np.stack([codes, cb.board2codes(chess.Board())])
+        self.assertTrue(np.array_equal(cb.codes_flip(batch)[1], cb.codes_flip(codes)))
+
+    # Test 31
+    def test_diagram_cache(self):
+        """the least recently used diagrams are dropped, hits and misses counted"""
+        cache = cb.DiagramCache(maxsize=2)
+        cache.put(1, (('a', 'norm'),))
+        cache.put(2, (('b', 'norm'),))
+        self.assertEqual(cache.get(1), (('a', 'norm'),))
+        cache.put(3, (('c', 'norm'),))
+        self.assertIsNone(cache.get(2))
+        self.assertEqual((len(cache), cache.hits, cache.misses), (2, 1, 1))
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            file_name = os.path.join(tmp_dir, 'diagrams.cache')
+            self.assertFalse(cb.DiagramCache().load(file_name))
+            self.assertTrue(cache.store(file_name))
+            loaded = cb.DiagramCache(maxsize=2)
+            self.assertTrue(loaded.load(file_name))
+            self.assertEqual(list(loaded.diagrams.items()), list(cache.diagrams.items()))
+        cache.resize(1)
+        self.assertEqual(list(cache.diagrams), [3])
+        cache.resize(0)
+        cache.put(4, (('d', 'norm'),))
+        self.assertEqual(len(cache), 0)
+
+    # Test 32
+    def test_split_ttf_str(self):
+        """the ttf str split at its marked squares"""
+        board = chess.Board('6R1/8/8/7k/2K5/8/8/6R1 w - - 0 1')
+        board.push_san("Rh1")
+        ttf_str = cb.board2ttf(board)
+        ttf_parts = cb.split_ttf_str(ttf_str, 'h5', 'g1', 'h1')
+        self.assertEqual([part_type for _, part_type in ttf_parts],
+                         ['norm', 'sq_check', 'norm', 'sq_from', 'sq_to', 'norm'])
+        self.assertEqual(''.join(ttf_part for ttf_part, _ in ttf_parts), ttf_str)
+        self.assertEqual(ttf_parts[1], (ttf_str[cb.get_linear_pos('h5')], 'sq_check'))
+        self.assertEqual(cb.split_ttf_str(ttf_str, '', '', ''), ((ttf_str, 'norm'),))
+        self.assertEqual(len(cb.split_ttf_str(ttf_str, 'c4', 'e2', 'g7')), 7)
+
+    # Test 33
+    def test_register_font(self):
+        """the font registry: glyph maps checked at registration,
+        its diagrams the same as those of board2ttf"""
+        self.assertEqual(set(cb.FONT_REGISTRY), set(cb.TTF_DICT))
+        board = chess.Board('r1bqkb1r/pppp1ppp/2n2n2/4p3/2B1P3/5N2/PPPP1PPP/RNBQK2R w KQkq - 4 4')
+        for ttf_font_name in cb.TTF_DICT:
+            self.assertEqual(cb.bitboards2ttf(board, ttf_font_name), cb.board2ttf(board))
+            self.assertEqual(cb.codes2ttf(cb.board2codes(board), ttf_font_name),
+                             cb.board2ttf(board))
+        leipzig = cb.get_font('Chess Leipzig')
+        self.assertNotIn('|x', leipzig.glyph_dict)
+        self.assertEqual(leipzig.glyphs[cb.CELL_CODE_DICT['|x']], cb.MISSING_GLYPH)
+        glyph_dict = {key: glyph for key, glyph in cb.FONT_DICT.items() if key != 'Kw'}
+        with self.assertRaises(cb.FontError):
+            cb.register_font('Chess Test', 'TEST.TTF', glyph_dict)
+        with self.assertRaises(cb.FontError):
+            cb.register_font('Chess Test', 'TEST.TTF', dict(glyph_dict, Kw='\u265a'))
+        with self.assertRaises(cb.FontError):
+            cb.get_font('Chess Test')
+        # a font with other glyphs, e.g. the white king on a white square as 'W'
+        font = cb.register_font('Chess Test', 'TEST.TTF', dict(glyph_dict, Kw='W'))
+        try:
+            board = chess.Board('4k3/8/8/8/8/8/8/5K2 w - - 0 1')
+            ttf_str = cb.bitboards2ttf(board, 'Chess Test')
+            self.assertEqual(ttf_str, cb.board2ttf(board).replace('k', 'W'))
+            self.assertEqual(cb.codes2ttf(cb.board2codes(board), 'Chess Test'), ttf_str)
+            board.push_san('Kg2')
+            self.assertEqual(cb.patch_ttf(ttf_str, chess.Board('4k3/8/8/8/8/8/8/5K2 w - - 0 1'),
+                                          board, 'Chess Test'),
+                             cb.bitboards2ttf(board, 'Chess Test'))
+            self.assertEqual(font.file_name, 'TEST.TTF')
+        finally:
+            del cb.FONT_REGISTRY['Chess Test']
+
+    # Test 34
+    def test_orientation(self):
+        """the diagrams from Black view: by the permutation tables
+        the same as the flipped diagrams from White view"""
+        game = chess.pgn.read_game(io.StringIO('1. e4 d5 2. exd5 Qxd5 3. Nc3 Qa5 4. d4 c6'))
+        board = game.board()
+        boards = []
+        for move in game.mainline_moves():
+            board.push(move)
+            boards.append(board.copy(stack=False))
+        self.assertTrue(cb.arr_isflipped(cb.board2arr(board, chess.BLACK), cb.board2arr(board)))
+        self.assertEqual(cb.board2str(chess.Board(), chess.BLACK), cb.START_BLACK_STR)
+        snapshots = np.array([[board.pawns, board.knights, board.bishops, board.rooks,
+                               board.queens, board.kings, board.occupied_co[chess.WHITE],
+                               board.occupied_co[chess.BLACK]] for board in boards],
+                             dtype=np.uint64)
+        codes = cb.snapshots2codes(snapshots, chess.BLACK)
+        self.assertTrue(cb.codes_isflipped(codes, cb.snapshots2codes(snapshots)))
+        orientations = [ply % 2 == 1 for ply in range(len(boards))]
+        self.assertEqual(cb.codes2ttf(cb.snapshots2codes(snapshots, orientations)),
+                         [cb.board2ttf(board, orientation)
+                          for board, orientation in zip(boards, orientations)])
+        ttf_str = cb.bitboards2ttf(boards[0], orientation=chess.BLACK)
+        for old_board, board in zip(boards, boards[1:]):
+            ttf_str = cb.patch_ttf(ttf_str, old_board, board, orientation=chess.BLACK)
+            self.assertEqual(ttf_str, cb.bitboards2ttf(board, orientation=chess.BLACK))
+        self.assertEqual(ttf_str, cb.board2ttf(board, chess.BLACK))
+        # a1 is at the top right from Black view
+        self.assertEqual(cb.get_linear_pos('a1', chess.BLACK), cb.get_linear_pos('h8'))
+        # rank 6 is above rank 7 from Black view
+        ttf_parts = cb.split_ttf_str(ttf_str[:-1], '', 'c7', 'c6', chess.BLACK)
+        self.assertEqual([part_type for _, part_type in ttf_parts],
+                         ['norm', 'sq_to', 'norm', 'sq_from', 'norm'])
+        self.assertEqual(ttf_parts[1], (ttf_str[cb.get_linear_pos('c6', chess.BLACK)], 'sq_to'))
+
 
 if __name__ == '__main__':
     unittest.main()
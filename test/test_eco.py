@@ -1,6 +1,13 @@
 """Functions related to the eco classification of standard chess"""
+import os
+import os.path
+import tempfile
+import io
 import unittest
 
+import chess
+import chess.pgn
+
 from context import eco
 
 
@@ -61,6 +68,102 @@ class TestEco(unittest.TestCase):
         res = eco.new_get_eco_data_for(pgn='1. b3')
         self.assertTrue(bool(res['eco'] == 'A01' and res['pgn'] == '1. b3'))
 
+    # Test 5
+    def test_pgn2sans(self):
+        """test the split of a normalized pgn into its SAN moves"""
+        self.assertEqual(eco.pgn2sans('1. e4 e5 2. Nf3 Nc6 3. O-O-O'),
+                         ['e4', 'e5', 'Nf3', 'Nc6', 'O-O-O'])
+        self.assertEqual(eco.pgn2sans('12...Nf6 13. Bb5+ *'),
+                         ['Nf6', 'Bb5+'])
+
+    # Test 6
+    def test_get_eco_data_for_sans(self):
+        """test the ECO trie walk: the longest opening found, by ECO code if given"""
+        res = eco.get_eco_data_for_sans(['b3', 'e5', 'Bb2', 'Nc6', 'Qd1'])
+        self.assertEqual(res['pgn'], '1. b3 e5 2. Bb2 Nc6')
+        res = eco.get_eco_data_for_sans(['b3', 'e5', 'Bb2', 'Nc6'], eco='A01')
+        self.assertEqual(res['eco'], 'A01')
+        self.assertEqual(eco.get_eco_data_for_sans(['h4', 'h5', 'Rh3'])['pgn'], '1. h4')
+        self.assertEqual(eco.get_eco_data_for_sans([]), {})
+
+    # Test 7
+    def test_get_eco_data_by_position(self):
+        """test the ECO position index: openings reached by a different move order"""
+        # the Queen's Gambit Declined, via the Reti move order
+        sans = ['Nf3', 'd5', 'd4', 'Nf6', 'c4', 'e6', 'Nc3', 'Be7', 'Bg5']
+        self.assertEqual(eco.get_eco_data_for_sans(sans)['eco'], 'A06')
+        res = eco.get_eco_data_by_position(sans)
+        self.assertEqual(res['eco'], 'D53')
+        self.assertEqual(res['fen'].split()[0],
+                         'rnbqk2r/ppp1bppp/4pn2/3p2B1/2PP4/2N2N2/PP2PPPP/R2QKB1R')
+        res = eco.new_get_eco_data_for(eco='B01', pgn='1. b3', by_position=True)
+        self.assertEqual(res['pgn'], '1. b3')
+        self.assertEqual(eco.get_eco_data_by_position(['h4', 'h5', 'Rh3'])['pgn'], '1. h4')
+        self.assertEqual(eco.get_eco_data_by_position([]), {})
+
+    # Test 8
+    def test_load_eco_data(self):
+        """test the ECO snapshot: built from the csv, reused, rebuilt if outdated"""
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            file_name = os.path.join(tmp_dir, 'eco.csv')
+            with self.assertRaises(eco.EcoDataError):
+                eco.load_eco_data(file_name)
+            eco.read_eco_csv().head(20).to_csv(file_name, index=False)
+            self.assertIsNone(eco.read_eco_snapshot(file_name))
+            eco_data = eco.load_eco_data(file_name)
+            self.assertEqual(len(eco_data.records), 20)
+            self.assertEqual(eco_data.records[0]['pgn'], '1. a3')
+            self.assertTrue(eco_data.records[0]['ttf'].endswith('\n'))
+            self.assertIn((0, 'a3'), eco_data.trie.edges)
+            # no temporary file left over
+            self.assertEqual(sorted(os.listdir(tmp_dir)),
+                             ['eco.csv', eco.get_snapshot_filename('eco.csv')])
+            snapshot = eco.read_eco_snapshot(file_name)
+            self.assertEqual(snapshot.records[19]['title'], eco_data.records[19]['title'])
+            # the csv changes, the snapshot is outdated
+            eco.read_eco_csv().head(10).to_csv(file_name, index=False)
+            self.assertIsNone(eco.read_eco_snapshot(file_name))
+            self.assertEqual(len(eco.load_eco_data(file_name).records), 10)
+
+    # Test 9
+    def test_get_eco_data__eco_db(self):
+        """test the choice of the ECO database, each loaded once"""
+        self.assertEqual(eco.get_eco_db_filename('en_2k'), eco.ECO_DB_DICT['en_2k'])
+        self.assertEqual(eco.get_eco_db_filename('my_eco.csv'), 'my_eco.csv')
+        with self.assertRaises(eco.EcoDataError):
+            eco.get_eco_db_filename('xx_1k')
+        small = eco.get_eco_data('en_2k')
+        self.assertIs(eco.get_eco_data('en_2k'), small)
+        self.assertIsNot(eco.get_eco_data(), small)
+        self.assertEqual(len(small.records), 2014)
+        res = eco.new_get_eco_data_for(pgn='1. e4 c5 2. Nf3 d6 3. d4 cxd4 4. Nxd4 Nf6 5. Nc3 a6',
+                                       eco_db='en_2k')
+        self.assertEqual(res['title'], 'Sicilian: Najdorf')
+
+    # Test 10
+    def test_get_eco_data_for_games(self):
+        """test the batch ECO classification of games and move lists"""
+        game = chess.pgn.read_game(io.StringIO(
+            '[ECO "A01"]\n\n1. b3 e5 2. Bb2 Nc6 3. e3 Nf6 *'))
+        sans = ['b3', 'e5', 'Bb2', 'Nc6', 'Qd1']
+        moves = [chess.Move.from_uci(uci) for uci in ('h2h4', 'h7h5', 'h1h3')]
+        games = [game, sans, moves, [], sans]
+        res = eco.get_eco_data_for_games(games)
+        self.assertEqual(len(res), 5)
+        self.assertEqual(res[0], eco.get_eco_data_for_sans(
+            ['b3', 'e5', 'Bb2', 'Nc6', 'e3', 'Nf6'], eco='A01'))
+        self.assertEqual(res[1]['pgn'], '1. b3 e5 2. Bb2 Nc6')
+        self.assertEqual(res[2]['pgn'], '1. h4')
+        self.assertEqual(res[3], {})
+        self.assertEqual(res[4]['pgn'], res[1]['pgn'])
+        self.assertIsNot(res[4], res[1])
+        set_up = chess.pgn.read_game(io.StringIO(
+            '[FEN "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1"]\n\n1. b3 *'))
+        self.assertEqual(eco.get_eco_data_for_games([set_up]), [{}])
+        res = eco.get_eco_data_for_games([sans, sans], ecos=['A01', ''])
+        self.assertEqual(res[0]['eco'], 'A01')
+        self.assertEqual(res[1]['pgn'], '1. b3 e5 2. Bb2 Nc6')
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,48 @@
+"""Functions concerning the manifest of rendered games"""
+import os.path
+import tempfile
+import unittest
+
+from context import manifest
+from context import pgn
+
+GAME = pgn.GameRecord({'Event': 'Troll Masters', 'White': 'Carlsen,Magnus'},
+                      '1. e4 Nf6', file_name='PGN/a.pgn')
+
+SETTINGS = {'font': 'Chess Merida', 'layout': 'A4', 'version': '0.1'}
+
+
+class TestManifest(unittest.TestCase):
+    """Collection of tests for manifest module"""
+
+    # Test 1
+    def test_game_key(self):
+        """the key depends on the game's content and the settings only"""
+        key = manifest.game_key(GAME, SETTINGS)
+        self.assertEqual(key, manifest.game_key(
+            pgn.GameRecord(GAME.headers, GAME.pgn, file_name='PGN/b.pgn', offset=100),
+            SETTINGS))
+        self.assertNotEqual(key, manifest.game_key(
+            pgn.GameRecord(GAME.headers, '1. e4 Nf6 2. e5'), SETTINGS))
+        self.assertNotEqual(key, manifest.game_key(
+            GAME, dict(SETTINGS, font='Chess Leipzig')))
+
+    # Test 2
+    def test_manifest(self):
+        """rendered games are found at the manifest while their docx file exists"""
+        key = manifest.game_key(GAME, SETTINGS)
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            self.assertEqual(manifest.load_manifest(tmp_dir), {})
+            docx_fn = os.path.join(tmp_dir, 'game.docx')
+            with open(docx_fn, 'w', encoding='utf-8'):
+                pass
+            with manifest.open_manifest(tmp_dir) as manifest_file:
+                manifest.append_entry(manifest_file, key, docx_fn)
+            manifest_dict = manifest.load_manifest(tmp_dir)
+            self.assertTrue(manifest.is_rendered(manifest_dict, key))
+            os.remove(docx_fn)
+            self.assertFalse(manifest.is_rendered(manifest_dict, key))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,6 +1,16 @@
 """Functions concerning pgn checks and docx generation"""
+import contextlib
+import io
+import shutil
+import tempfile
 import unittest
 
+import chess
+import chess.pgn
+
+from context import analysis
+from context import chessboard as cb
+from context import eco
 from context import pgn
 
 
@@ -22,6 +32,101 @@ class TestPgn(unittest.TestCase):
         self.assertTrue(len(pgn.get_games_from_pgnfile(
             'test/pgn/test_do_not_change.pgn')) == 5)
 
+    # Test 2a
+    def test_iter_games_from_pgnfile(self):
+        """checks the streamed pgn game retrieval from a pgn file"""
+        games = pgn.iter_games_from_pgnfile('test/pgn/test_do_not_change.pgn')
+        # a generator, no list
+        self.assertFalse(isinstance(games, list))
+        game = next(games)
+        self.assertEqual(game.file, 'test/pgn/test_do_not_change.pgn')
+        self.assertTrue(game.pgn.startswith('1. '))
+        # the remaining 4 games
+        self.assertEqual(len(pgn.collect(games)), 4)
+
+    # Test 2b
+    def test_iter_games_from_pgnfile_filtered(self):
+        """checks the header filter at the pgn game retrieval"""
+        header_filter = pgn.make_header_filter(player='brameld', result='0-1')
+        games = list(pgn.iter_games_from_pgnfile(
+            'test/pgn/test_do_not_change.pgn', header_filter))
+        self.assertEqual(len(games), 1)
+        self.assertEqual(games[0].headers['Black'], 'Brameld,A')
+        # same filter evaluated at the index' headers, of a copy of the file
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            pgn_name = shutil.copy('test/pgn/test_do_not_change.pgn', tmp_dir)
+            self.assertEqual(
+                [game.pgn for game in games],
+                [game.pgn for game in pgn.iter_games_from_index(
+                    pgn_name, header_filter=header_filter)])
+
+    # Test 2c
+    def test_make_header_filter(self):
+        """checks the date and eco ranges of a header filter"""
+        headers = {'Date': '1879.??.??', 'ECO': 'C45'}
+        self.assertTrue(pgn.make_header_filter(date_from='1879.06.01')(headers))
+        self.assertFalse(pgn.make_header_filter(date_to='1878.12.31')(headers))
+        self.assertTrue(pgn.make_header_filter(eco_from='C00', eco_to='C99')(headers))
+        self.assertFalse(pgn.make_header_filter(eco_from='D00')(headers))
+        self.assertFalse(pgn.make_header_filter(eco_to='B99')({'Date': '2001.01.05'}))
+
+    # Test 2d
+    def test_read_mainline(self):
+        """checks the lean reading of an annotated pgn game"""
+        pgn_str = '[Event "Annotated"]\n\n' + \
+            '1. e4 { [%eval 0.2] [%clk 0:03:00] } 1... e5 $1 ' + \
+            '( 1... c5 { Sicilian } 2. Nf3 ( 2. c3 ) ) 2. Nf3 ?! Nc6 *\n'
+        mainline = pgn.read_mainline(io.StringIO(pgn_str))
+        self.assertEqual(mainline.headers['Event'], 'Annotated')
+        self.assertEqual(mainline.analysis.sans, ['e4', 'e5', 'Nf3', 'Nc6'])
+        self.assertEqual(mainline.pgn(), '1. e4 e5 2. Nf3 Nc6')
+        self.assertIsNone(pgn.read_mainline(io.StringIO(pgn_str[len(pgn_str):])))
+
+    # Test 2e
+    def test_game_record_headers(self):
+        """each game keeps just its own headers, no tag of another game"""
+        pgn_str = '[Event "A"]\n[ECO "B01"]\n[WhiteElo "2800"]\n\n1. e4 d5 1-0\n\n' + \
+            '[Event "B"]\n\n1. d4 0-1\n'
+        games = list(pgn.iter_games_from_handle(io.StringIO(pgn_str), 'mixed.pgn'))
+        self.assertEqual(games[0].headers['WhiteElo'], '2800')
+        self.assertNotIn('ECO', games[1].headers)
+        self.assertNotIn('WhiteElo', games[1].headers)
+        self.assertEqual((games[1].pgn, games[1].file, games[1].offset),
+                         ('1. d4', 'mixed.pgn', None))
+        self.assertEqual(list(pgn.collect(games)['ECO']), ['B01', ''])
+
+    # Test 2f
+    def test_parse_error_reported(self):
+        """an illegal SAN is reported, the game is kept up to it"""
+        pgn_str = '[Event "Illegal"]\n\n1. e4 e5 2. Ke3 Nc6 *\n'
+        with contextlib.redirect_stdout(io.StringIO()) as out:
+            games = list(pgn.iter_games_from_handle(io.StringIO(pgn_str), 'illegal.pgn'))
+        self.assertEqual(games[0].pgn, '1. e4 e5')
+        self.assertIn('Ke3', out.getvalue())
+        self.assertIn('at file: illegal.pgn', out.getvalue())
+
+    # Test 2g
+    def test_eco_by_position_of_parsed_game(self):
+        """a parsed game is classified by position just like its pgn"""
+        pgn_str = '[Event "Transposed"]\n\n1. Nf3 d5 2. d4 Nf6 *\n'
+        game = next(pgn.iter_games_from_handle(io.StringIO(pgn_str), 'transposed.pgn'))
+        self.assertEqual(pgn.get_eco_data_for_game(game, eco_by_position=True),
+                         eco.new_get_eco_data_for(pgn=game.pgn, by_position=True))
+
+    # Test 2h
+    def test_eco_of_set_up_game(self):
+        """a game from a set-up position is not classified by its moves,
+        just as by the batch classification"""
+        pgn_str = '[Event "Set-up"]\n[ECO "C20"]\n[SetUp "1"]\n' + \
+            '[FEN "4k3/8/8/8/8/8/4P3/4K3 w - - 0 40"]\n\n40. e4 Kd7 *\n'
+        game = next(pgn.iter_games_from_handle(io.StringIO(pgn_str), 'setup.pgn'))
+        self.assertEqual(game.analysis.sans, ['e4', 'Kd7'])
+        self.assertEqual(pgn.get_eco_data_for_game(game), {})
+        self.assertEqual(eco.get_eco_data_for_games(
+            [chess.pgn.read_game(io.StringIO(pgn_str))]), [{}])
+        self.assertEqual(pgn.get_eco_data_for_game(game, eco_by_position=True), {})
+        self.assertEqual(pgn.get_eco_data_for_game(pgn.GameRecord(game.headers, game.pgn)), {})
+
     # Test 3
     def test_get_incremented_filename(self):
         """checks gene. of increm. filename if already exists"""
@@ -32,6 +137,15 @@ class TestPgn(unittest.TestCase):
             'test/docx/test_do_not_change') ==
             'test/docx/test_do_not_change-1')
 
+    # Test 3a
+    def test_get_incremented_filename_reserved(self):
+        """checks that reserved file names count as existing"""
+        self.assertEqual(
+            pgn.get_incremented_filename(
+                'test/docx/test_do_not_change',
+                reserved={'test/docx/test_do_not_change-1'}),
+            'test/docx/test_do_not_change-2')
+
     # Test 4
     def test_prep_ttfboards_from_pgn(self):
         """correct ttfboard genration with given pgn move"""
@@ -65,6 +179,74 @@ class TestPgn(unittest.TestCase):
             and
             b_test_brd_str == res_dict['b_board_ttf'])
 
+    # Test 4a
+    def test_prep_move_table(self):
+        """one FullMove per full move, a last white move is left out"""
+        move_table = pgn.prep_move_table(
+            analysis.analyze_pgn('1. e4 e5 2. Bc4 Nc6 3. Qh5 Nf6 4. Qxf7#'))
+        self.assertEqual(len(move_table), 3)
+        self.assertEqual(move_table[0].to_dict(),
+                         pgn.prep_ttfboards_from_pgn('1. e4 e5').iloc[0].to_dict())
+        self.assertEqual((move_table[2].fmvn, move_table[2].w_hmv_str,
+                          move_table[2].b_hmv_str, move_table[2].b_sq_from,
+                          move_table[2].b_sq_to, move_table[2].b_sq_check),
+                         (3, '3. Qh5 ... ', '3.  ... Nf6', 'g8', 'f6', ''))
+
+    # Test 4b
+    def test_prep_move_table_cached(self):
+        """the diagrams of positions seen before are taken from the diagram cache"""
+        game_analysis = analysis.analyze_pgn('1. e4 e5 2. Nf3 Nc6 3. Bb5 a6')
+        cache = cb.DiagramCache(maxsize=64)
+        move_table = pgn.prep_move_table(game_analysis, diagram_cache=cache)
+        self.assertEqual((cache.hits, cache.misses, len(cache)), (0, 6, 6))
+        self.assertEqual(pgn.prep_move_table(game_analysis, diagram_cache=cache)[2].b_diagram,
+                         move_table[2].b_diagram)
+        self.assertEqual((cache.hits, cache.misses), (6, 6))
+        self.assertEqual(''.join(part for part, _ in move_table[0].w_diagram) + '\n',
+                         move_table[0].w_board_ttf)
+        self.assertIn(('n', 'sq_to'), move_table[1].w_diagram)
+
+    # Test 4c
+    def test_prep_move_table_orientation(self):
+        """the diagrams from Black view, or from the side to move, cached per orientation"""
+        game_analysis = analysis.analyze_pgn('1. e4 e5 2. Nf3 Nc6')
+        boards = [analysis.snapshot2board(game_analysis.snapshot(ply)) for ply in range(4)]
+        cache = cb.DiagramCache(maxsize=64)
+        move_table = pgn.prep_move_table(game_analysis, diagram_cache=cache, orientation='black')
+        self.assertEqual([move_table[0].w_board_ttf, move_table[0].b_board_ttf],
+                         [cb.board2ttf(board, chess.BLACK) for board in boards[:2]])
+        move_table = pgn.prep_move_table(game_analysis, diagram_cache=cache, orientation='turn')
+        self.assertEqual((cache.hits, cache.misses), (2, 6))
+        self.assertEqual([move_table[1].w_board_ttf, move_table[1].b_board_ttf],
+                         [cb.board2ttf(boards[2], chess.BLACK), cb.board2ttf(boards[3])])
+        # g1 is above f3 from Black view
+        self.assertEqual([part_type for _, part_type in move_table[1].w_diagram],
+                         ['norm', 'sq_from', 'norm', 'sq_to', 'norm'])
+        with self.assertRaises(ValueError):
+            pgn.prep_move_table(game_analysis, orientation='north')
+
+    # Test 4d
+    def test_patch_diagrams(self):
+        """the patched diagrams equal board2ttf, from the diagrams given before them,
+        for all games and orientations"""
+        for game in pgn.iter_games_from_pgnfile('test/pgn/test_do_not_change.pgn'):
+            game_analysis = game.analysis
+            plies = range(len(game_analysis))
+            boards = [analysis.snapshot2board(game_analysis.snapshot(ply)) for ply in plies]
+            for orientation in pgn.ORIENTATIONS:
+                orientations = pgn.get_orientations(game_analysis, orientation)
+                expected = [cb.board2ttf(board, side) for board, side in zip(boards, orientations)]
+                self.assertEqual(pgn.patch_diagrams(game_analysis, [None] * len(boards), plies,
+                                                    orientations=orientations), expected)
+                # every third diagram given, segmented, the others patched
+                diagrams = [cb.split_ttf_str(board_ttf[:-1], '', '', '', side)
+                            if ply % 3 == 0 else None
+                            for ply, (board_ttf, side) in enumerate(zip(expected, orientations))]
+                missing = [ply for ply in plies if diagrams[ply] is None]
+                self.assertEqual(pgn.patch_diagrams(game_analysis, diagrams, missing,
+                                                    orientations=orientations),
+                                 [expected[ply] for ply in missing])
+
     # # Test 5
     # TODO
     # def test_gen_document_from_game(self):
@@ -0,0 +1,143 @@
+"""Functions concerning the byte-offset index of pgn files"""
+import os.path
+import shutil
+import tempfile
+import unittest
+
+from context import pgn, pgnindex, watch
+
+TEST_PGN = 'test/pgn/test_do_not_change.pgn'
+LATIN1_PGN = 'test/pgn/test_latin1.pgn'
+
+
+class TestPgnIndex(unittest.TestCase):
+    """Collection of tests for pgnindex module"""
+
+    def setUp(self):
+        # the sidecar index is written next to a copy of the test pgn file
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.pgn_name = shutil.copy(TEST_PGN, self.tmp_dir.name)
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    # Test 1
+    def test_build_index(self):
+        """one row per game, with its offset and key headers"""
+        index_df = pgnindex.build_index(TEST_PGN)
+        self.assertEqual(len(index_df), 5)
+        self.assertEqual(index_df['offset'].iloc[0], 0)
+        self.assertEqual(index_df['Black'].iloc[1], 'Brameld,A')
+        self.assertEqual(index_df['ECO'].iloc[1], 'B05')
+
+    # Test 2
+    def test_load_index(self):
+        """the sidecar index gives the same as a fresh scan"""
+        pgnindex.load_index(self.pgn_name, rebuild=True)
+        self.assertTrue(pgnindex.load_index(self.pgn_name).equals(
+            pgnindex.build_index(self.pgn_name)))
+        self.assertEqual(pgnindex.load_offsets(self.pgn_name).tolist(),
+                         pgnindex.build_index(self.pgn_name)[['offset', 'length']]
+                         .to_numpy().tolist())
+
+    # Test 3
+    def test_get_game_from_pgnfile(self):
+        """random access to game N gives the same as a sequential parse"""
+        games = list(pgn.iter_games_from_pgnfile(self.pgn_name))
+        game = pgn.get_game_from_pgnfile(self.pgn_name, 3)
+        self.assertEqual(game.pgn, games[3].pgn)
+        self.assertEqual(game.headers['White'], games[3].headers['White'])
+        self.assertEqual(game.offset, pgnindex.load_index(self.pgn_name)['offset'][3])
+        with self.assertRaises(IndexError):
+            pgn.get_game_from_pgnfile(self.pgn_name, 5)
+
+    # Test 3b
+    def test_byte_order_mark(self):
+        """the first game of a file with a UTF-8 byte order mark is indexed"""
+        with open(TEST_PGN, 'rb') as pgn_file:
+            pgn_bytes = pgn_file.read()
+        with open(self.pgn_name, 'wb') as pgn_file:
+            pgn_file.write(b'\xef\xbb\xbf' + pgn_bytes)
+        games = list(pgn.iter_games_from_pgnfile(self.pgn_name))
+        self.assertEqual(len(pgnindex.load_index(self.pgn_name)), len(games))
+        self.assertEqual(pgnindex.load_index(self.pgn_name)['offset'][0], 3)
+        self.assertEqual(pgn.get_game_from_pgnfile(self.pgn_name, 0).pgn, games[0].pgn)
+        self.assertEqual(pgn.get_game_from_pgnfile(self.pgn_name, 4).pgn, games[4].pgn)
+
+    # Test 4
+    def test_split_index(self):
+        """the work units cover all games, in order, without overlap"""
+        index_df = pgnindex.build_index(TEST_PGN)
+        ranges = pgnindex.split_index(index_df, 3)
+        self.assertEqual(len(ranges), 3)
+        self.assertEqual(ranges[0][0], 0)
+        self.assertEqual(ranges[-1][1], 5)
+        for (_, stop), (start, _) in zip(ranges, ranges[1:]):
+            self.assertEqual(stop, start)
+        self.assertEqual(len(pgnindex.split_index(index_df, 10)), 5)
+
+    # Test 5
+    def test_split_pgnfile(self):
+        """the byte ranges cover the file and start at game boundaries"""
+        ranges = pgnindex.split_pgnfile(TEST_PGN, 3)
+        self.assertEqual(len(ranges), 3)
+        self.assertEqual(ranges[0][0], 0)
+        offsets = list(pgnindex.build_index(TEST_PGN)['offset'])
+        for start, _ in ranges:
+            self.assertIn(start, offsets)
+        for (_, end), (start, _) in zip(ranges, ranges[1:]):
+            self.assertEqual(end, start)
+
+    # Test 6
+    def test_iter_games_parallel(self):
+        """parallel chunked parsing gives the games of a sequential parse"""
+        chunk_size = pgn.PARSE_CHUNK_SIZE
+        pgn.PARSE_CHUNK_SIZE = 1000
+        try:
+            games = list(pgn.iter_games_from_pgnfile(TEST_PGN, jobs=2))
+        finally:
+            pgn.PARSE_CHUNK_SIZE = chunk_size
+        self.assertEqual(games, list(pgn.iter_games_from_pgnfile(TEST_PGN)))
+
+    # Test 7
+    def test_compressed_pgnfiles(self):
+        """compressed pgn files give the same games and index as the plain file"""
+        with open(TEST_PGN, 'rb') as pgn_file:
+            pgn_bytes = pgn_file.read()
+        games = list(pgn.iter_games_from_pgnfile(TEST_PGN))
+        index_df = pgnindex.build_index(TEST_PGN)
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            for ext, module in pgnindex.COMPRESSION_DICT.items():
+                file_name = os.path.join(tmp_dir, 'test.pgn' + ext)
+                with module.open(file_name, 'wb') as comp_file:
+                    comp_file.write(pgn_bytes)
+                self.assertEqual(list(pgn.iter_games_from_pgnfile(file_name, jobs=2)),
+                                 [pgn.GameRecord(game.headers, game.pgn, game.analysis,
+                                                 file_name) for game in games])
+                self.assertTrue(pgnindex.build_index(file_name).equals(index_df))
+                self.assertEqual(pgn.get_game_from_pgnfile(file_name, 4).pgn,
+                                 games[4].pgn)
+            self.assertEqual(len(pgn.get_pgnfile_names_from_dir(tmp_dir)), 3)
+
+    # Test 8
+    def test_latin1_pgnfile(self):
+        """a Latin-1 pgn file gives the same games at every reader, names intact"""
+        self.assertEqual(pgnindex.decode_pgn('Réti '.encode('utf-8') + 'Müller'.encode('latin-1')),
+                         'Réti Müller')
+        file_name = shutil.copy(LATIN1_PGN, self.tmp_dir.name)
+        games = [(game.headers, game.pgn) for game in pgn.iter_games_from_pgnfile(file_name)]
+        self.assertEqual([headers['Black'] for headers, _ in games],
+                         ['Müller, Jürgen', 'Tarrasch, Siegbert'])
+        self.assertEqual(games[1][0]['White'], 'Réti, Richard')
+        self.assertEqual([(game.headers, game.pgn) for game
+                          in pgn.iter_games_from_pgnfile(file_name, jobs=2)], games)
+        self.assertEqual([(game.headers, game.pgn) for game
+                          in pgn.iter_games_from_index(file_name)], games)
+        self.assertEqual(list(pgnindex.load_index(file_name)['White']),
+                         [headers['White'] for headers, _ in games])
+        [(watched, _)] = watch.iter_new_batches(file_name, 0)
+        self.assertEqual([(game.headers, game.pgn) for game in watched], games)
+
+
+if __name__ == '__main__':
+    unittest.main()
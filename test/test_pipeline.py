@@ -0,0 +1,52 @@
+"""Functions concerning the staged docx generation pipeline"""
+import gc
+import os.path
+import tempfile
+import unittest
+from concurrent.futures import ProcessPoolExecutor
+
+from context import pgn, pipeline
+
+
+class TestPipeline(unittest.TestCase):
+    """Collection of tests for pipeline module"""
+
+    # Test 1
+    def test_run_pipeline(self):
+        """all tasks are stored, in the order of the tasks"""
+        games = list(pgn.iter_games_from_pgnfile('test/pgn/test_do_not_change.pgn'))[:2]
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            tasks = [(game, os.path.join(tmp_dir, f'{number}.docx'))
+                     for number, game in enumerate(games)]
+            results = list(pipeline.run_pipeline(iter(tasks),
+                                                 write_jobs=2,
+                                                 queue_size=1))
+            self.assertEqual([ret_dict['file_name'] for ret_dict in results],
+                             [docx_fn for _, docx_fn in tasks])
+            self.assertTrue(all(ret_dict['done'] for ret_dict in results))
+            self.assertTrue(all(os.path.getsize(docx_fn) > 0 for _, docx_fn in tasks))
+
+    # Test 2
+    def test_run_pipeline_parse_error(self):
+        """an error at the parse stage is raised at the consumer"""
+        def tasks():
+            raise ValueError('broken pgn')
+            yield  # pylint: disable=unreachable
+        with self.assertRaises(ValueError):
+            list(pipeline.run_pipeline(tasks()))
+
+    # Test 3
+    def test_worker_freezes_eco_data(self):
+        """a render worker keeps its ECO data off the garbage collector"""
+        with ProcessPoolExecutor(max_workers=1, mp_context=pgn.WORKER_CONTEXT,
+                                 initializer=pgn.init_worker) as pool:
+            self.assertGreater(pool.submit(gc.get_freeze_count).result(), 0)
+
+    # Test 4
+    def test_workers_not_forked_from_pipeline(self):
+        """the worker processes are not forked from the process running the threads"""
+        self.assertNotEqual(pgn.WORKER_CONTEXT.get_start_method(), 'fork')
+
+
+if __name__ == '__main__':
+    unittest.main()
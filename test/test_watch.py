@@ -0,0 +1,61 @@
+"""Functions concerning the watching of pgn files for appended games"""
+import os.path
+import shutil
+import tempfile
+import unittest
+
+from context import watch
+
+TEST_PGN = 'test/pgn/test_do_not_change.pgn'
+
+
+class TestWatch(unittest.TestCase):
+    """Collection of tests for watch module"""
+
+    # Test 1
+    def test_iter_new_batches(self):
+        """only complete games are read, each once"""
+        with open(TEST_PGN, 'rb') as pgn_file:
+            pgn_bytes = pgn_file.read()
+        # cut the 2nd game in the middle of its movetext
+        cut = pgn_bytes.index(b'[Event', 10) + 300
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            file_name = os.path.join(tmp_dir, 'live.pgn')
+            with open(file_name, 'wb') as pgn_file:
+                pgn_file.write(pgn_bytes[:cut])
+            [(games, offset)] = watch.iter_new_batches(file_name, 0)
+            self.assertEqual([game.headers['Round'] for game in games], ['1'])
+            self.assertEqual(list(watch.iter_new_batches(file_name, offset)), [])
+            with open(file_name, 'ab') as pgn_file:
+                pgn_file.write(pgn_bytes[cut:])
+            [(games, offset)] = watch.iter_new_batches(file_name, offset)
+            self.assertEqual([game.headers['Round'] for game in games],
+                             ['2', '3', '4', '5'])
+            self.assertEqual(offset, len(pgn_bytes))
+
+    # Test 1a
+    def test_iter_new_batches_in_blocks(self):
+        """a file is read in blocks, each game once, also games larger than a block"""
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            file_name = os.path.join(tmp_dir, 'archive.pgn')
+            shutil.copy(TEST_PGN, file_name)
+            for block_size in (100, 1500):
+                batches = list(watch.iter_new_batches(file_name, 0, block_size=block_size))
+                self.assertGreater(len(batches), 1)
+                self.assertEqual([game.headers['Round'] for games, _ in batches
+                                  for game in games], ['1', '2', '3', '4', '5'])
+                offsets = [offset for _, offset in batches]
+                self.assertEqual(offsets, sorted(offsets))
+                self.assertEqual(offsets[-1], os.path.getsize(file_name))
+
+    # Test 2
+    def test_state(self):
+        """the watch state is stored and loaded"""
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            self.assertEqual(watch.load_state(tmp_dir), {})
+            watch.store_state(tmp_dir, {'PGN/live.pgn': 1022})
+            self.assertEqual(watch.load_state(tmp_dir), {'PGN/live.pgn': 1022})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,97 @@
+"""functions to watch the pgn files at a directory for appended games"""
+
+import io
+import json
+import os
+import os.path
+import time
+
+import pgn
+import pgnindex
+
+# the watch state at the docx directory:
+# per pgn file the byte offset up to which its games are processed
+WATCH_STATE_NAME = '.pgn2docx_watch'
+
+# max. number of bytes read at once, the games of each block are parsed
+# and rendered before the next block is read; larger for a larger game
+WATCH_BLOCK_SIZE = 4 * 1024 * 1024
+
+
+def get_state_filename(docx_dir: str) -> str:
+    """Return the file name of the watch state at the docx_dir"""
+    return os.path.join(docx_dir, WATCH_STATE_NAME)
+
+
+def load_state(docx_dir: str) -> dict:
+    """Return the watch state of the docx_dir as dict{<pgn file name>: <offset>},
+    empty if there is no state yet"""
+    file_name = get_state_filename(docx_dir)
+    if not os.path.isfile(file_name):
+        return {}
+    with open(file_name, 'r', encoding='utf-8') as state_file:
+        return json.load(state_file)
+
+
+def store_state(docx_dir: str, state: dict):
+    """Store the watch state at the docx_dir, replacing the old state at once"""
+    file_name = get_state_filename(docx_dir)
+    with open(file_name + '.tmp', 'w', encoding='utf-8') as state_file:
+        json.dump(state, state_file, indent=1)
+    os.replace(file_name + '.tmp', file_name)
+
+
+def iter_new_batches(file_name: str, offset: int, header_filter=None,
+                     block_size=WATCH_BLOCK_SIZE):
+    """Yield (games, offset) for the complete games appended to the
+    pgn file_name after offset, read in blocks of about block_size bytes:
+    per block its games, as pgn.GameRecords, and the offset after them;
+    a game still being written stays for the next call"""
+    if os.path.getsize(file_name) < offset:
+        # the file was truncated or replaced, start again
+        offset = 0
+    with open(file_name, 'rb') as pgn_file:
+        pgn_file.seek(offset)
+        data = b''
+        while True:
+            block = pgn_file.read(block_size)
+            data += block
+            end = pgnindex.find_complete_end(data)
+            if end == 0:
+                if len(block) < block_size:
+                    # no complete game up to the end of the file
+                    return
+                # a game larger than the block, read on
+                continue
+            game_text = io.StringIO(pgnindex.decode_pgn(data[:end]))
+            games = list(pgn.iter_games_from_handle(game_text, file_name, header_filter))
+            offset += end
+            yield games, offset
+            data = data[end:]
+
+
+def iter_new_games(pgn_dir: str, state: dict, header_filter=None, interval=0.2):
+    """Yield (file_name, games, offset) for each batch of complete games
+    appended to the plain pgn files at pgn_dir, see iter_new_batches(),
+    polled every interval seconds;
+    after processing a batch, its offset is to be put into the state.
+    Runs until interrupted, e.g. by Ctrl-C."""
+    sizes = {}
+    while True:
+        for file_name in pgn.get_pgnfile_names_from_dir(pgn_dir=pgn_dir):
+            # compressed files can not be appended to
+            if pgnindex.is_compressed(file_name):
+                continue
+            try:
+                size = os.path.getsize(file_name)
+            except OSError:
+                continue
+            # only read files that changed since the last poll
+            if sizes.get(file_name) == size:
+                continue
+            sizes[file_name] = size
+            for games, offset in iter_new_batches(file_name,
+                                                  state.get(file_name, 0),
+                                                  header_filter):
+                yield file_name, games, offset
+        time.sleep(interval)